@@ -0,0 +1,165 @@
+import argparse
+import contextlib
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+dir_path = os.path.abspath(os.path.join(__file__, "../.."))
+sys.path.append(os.path.join(dir_path, "src"))
+
+from parsers import Parser, ParserWithProxy
+from F import read_yaml
+from retry import RetryPolicy
+from sessions import SessionPool
+from sinks import CsvSink
+from mock_server import MockServer
+
+FIXTURES_PATH = os.path.join(dir_path, "bench", "fixtures")
+CONFIGS_PATH = os.path.join(dir_path, "configs")
+
+# behaviour of every 10 feeds (see FeedHandler), the rest of the feeds are served normally
+BEHAVIOURS = {1: {'delay': 0.5},
+              3: {'flaky': 1},
+              5: {'limit': 1},
+              7: {'fail': 404},
+              9: {'fail': 503}}
+
+
+def read_fixtures():
+    """
+    Returns saved pages in format d[parser_type] = (body, content type)
+    """
+    fixtures = {}
+    for parser_type, filename, content_type in [('rss', 'rss.xml', 'application/rss+xml; charset=utf-8'),
+                                                ('thebell', 'thebell.html', 'text/html; charset=utf-8')]:
+        with open(os.path.join(FIXTURES_PATH, filename), 'rb') as f:
+            fixtures[parser_type] = (f.read(), content_type)
+    return fixtures
+
+
+def parser_config(configs, parser_type):
+    """
+    Returns config of the first url of parser_type in configs.yaml
+    """
+    k = configs['parser_type'].index(parser_type)
+    return dict([(key, values[k]) for key, values in configs['parser_config'].items()])
+
+
+def make_feeds(server, configs, n_feeds, prefix='feed'):
+    """
+    Returns urls, sources, configs and parser types of n_feeds feeds (every 5th one is TheBell page)
+    """
+    feeds = {'urls': [], 'sources': [], 'configs': [], 'parser_types': []}
+    for k in range(n_feeds):
+        parser_type = 'thebell' if k % 5 == 4 else 'rss'
+        feeds['urls'].append(server.url(k, parser_type, f'{prefix}{k}', **BEHAVIOURS.get(k % 10, {})))
+        feeds['sources'].append(f'{prefix}{k}')
+        feeds['configs'].append(parser_config(configs, parser_type))
+        feeds['parser_types'].append(parser_type)
+    return feeds
+
+
+def run(parser, feeds, configs, number_of_tries, memory=False):
+    """
+    Runs search of parser on feeds and returns its statistics (peak memory is traced only if memory is True,
+    as tracing slows parsing down several times)
+    """
+    if memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        output = parser.search(urls=feeds['urls'],
+                               sources=feeds['sources'],
+                               configs=feeds['configs'],
+                               fields=configs['data_fields'],
+                               log_fields=configs['log_fields'],
+                               parser_types=feeds['parser_types'],
+                               number_of_tries=number_of_tries)
+    wall_time = time.perf_counter() - start
+    peak = None
+    if memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    log = output[1]
+    statuses = {}
+    for status_code, error in zip(log['STATUS_CODE'], log['ERROR']):
+        key = status_code or ('error' if error else 'none')
+        statuses[key] = statuses.get(key, 0) + 1
+    items = sum([int(n) for n in log['title'] if n.isdigit()])
+    return {'urls': len(feeds['urls']),
+            'tries': len(log['TRY']),
+            'items': items,
+            'wall_time': wall_time,
+            'peak': peak,
+            'statuses': statuses}
+
+
+def report(name, stats):
+    print(f'{name}:')
+    print(f'   urls: {stats["urls"]}, tries: {stats["tries"]}, items: {stats["items"]}')
+    print(f'   statuses: {", ".join([f"{k}: {v}" for k, v in sorted(stats["statuses"].items())])}')
+    print(f'   wall time: {stats["wall_time"]:.2f} s')
+    print(f'   throughput: {stats["urls"] / stats["wall_time"]:.1f} urls/s, {stats["items"] / stats["wall_time"]:.0f} items/s')
+    if stats['peak'] is not None:
+        print(f'   peak memory: {stats["peak"] / 2 ** 20:.1f} MB')
+
+
+if __name__ == '__main__':
+    configs = read_yaml(path=CONFIGS_PATH,
+                        filename='configs')
+
+    arg_parser = argparse.ArgumentParser(description='Benchmark of parsing with local mock servers')
+    arg_parser.add_argument('--feeds', type=int, default=50, help='number of feeds')
+    arg_parser.add_argument('--hosts', type=int, default=5, help='number of feed servers')
+    arg_parser.add_argument('--live-proxies', type=int, default=2, help='number of working proxies')
+    arg_parser.add_argument('--dead-proxies', type=int, default=2, help='number of proxies refusing connections')
+    arg_parser.add_argument('--timeout', type=float, default=0, help='timeout between requests (in seconds)')
+    arg_parser.add_argument('--base-delay', type=float, default=configs['retry_policy']['base_delay'],
+                            help='delay before the second try (in seconds)')
+    arg_parser.add_argument('--no-retry-policy', action='store_true', help='retry all failed urls right away')
+    arg_parser.add_argument('--no-sessions', action='store_true', help='make a new connection for each request')
+    arg_parser.add_argument('--no-memory', action='store_true', help='skip the extra run with tracing of memory')
+    args = arg_parser.parse_args()
+
+    server = MockServer(fixtures=read_fixtures(),
+                        n_hosts=args.hosts,
+                        n_live_proxies=args.live_proxies,
+                        n_dead_proxies=args.dead_proxies)
+
+    with tempfile.TemporaryDirectory() as path:
+        for kind in ['no_proxy', 'proxy']:
+            retry_policy = None
+            if not args.no_retry_policy:
+                retry_policy = RetryPolicy(base_delay=args.base_delay,
+                                           max_delay=configs['retry_policy']['max_delay'],
+                                           jitter=configs['retry_policy']['jitter'],
+                                           retry_statuses=configs['retry_policy']['retry_statuses'][kind])
+            kwargs = {'waiting_time': configs['waiting_time'][kind],
+                      'timeout_between_requests': args.timeout,
+                      'max_workers': configs['max_workers'][kind],
+                      'session_pool': None if args.no_sessions else SessionPool(),
+                      'retry_policy': retry_policy,
+                      'sink': CsvSink(path=path,
+                                      filename=kind,
+                                      fields=configs['data_fields'],
+                                      batch_size=configs['streaming']['batch_size'])}
+            if kind == 'no_proxy':
+                parser = Parser(**kwargs)
+                feeds = make_feeds(server, configs, args.feeds)
+            else:
+                parser = ParserWithProxy(proxies=server.proxies(),
+                                         proxies_per_url=configs['proxies_per_url'],
+                                         **kwargs)
+                feeds = make_feeds(server, configs, max(args.feeds // 5, 1), prefix='proxy_feed')
+
+            stats = run(parser, feeds, configs, configs['number_of_tries'][kind])
+            if not args.no_memory:
+                server.reset()
+                stats['peak'] = run(parser, feeds, configs, configs['number_of_tries'][kind], memory=True)['peak']
+            parser.sink.close()
+            report(f'{parser.__class__.__name__}.search', stats)
+
+    server.close()
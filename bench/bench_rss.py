@@ -0,0 +1,81 @@
+import os
+import re
+import sys
+import tempfile
+import time
+
+dir_path = os.path.abspath(os.path.join(__file__, "../.."))
+sys.path.append(os.path.join(dir_path, "src"))
+
+from parsers import SubSteps
+from seen_index import SeenIndex
+
+FIXTURES_PATH = os.path.join(dir_path, "bench", "fixtures")
+FIELDS = ['title', 'summary', 'date', 'link', 'type', 'source', 'date_parsed']
+CONFIG = {'title_tag': 'title', 'summary_tag': 'summary', 'date_tag': 'published_parsed', 'link_tag': 'link',
+          'type_tag': 'term'}
+
+
+class Response:
+    """
+    Stand-in for requests.Response with a saved feed
+    """
+    def __init__(self, content, status_code=200):
+        self.content = content
+        self.text = content.decode('utf8')
+        self.status_code = status_code
+
+
+def large_feed(content, n_items):
+    """
+    Returns feed with n_items built by repeating items of the saved feed (links are made unique)
+    """
+    head, rest = content.split(b'<item>', 1)
+    items = [b'<item>' + item for item in rest.split(b'<item>')]
+    items[-1], tail = items[-1].split(b'</channel>', 1)
+    tail = b'</channel>' + tail
+    copies = []
+    for k in range(n_items):
+        item = items[k % len(items)]
+        copies.append(re.sub(rb'/news/(\d+)', lambda m: b'/news/%d-%d' % (int(m.group(1)), k), item))
+    return head + b''.join(copies) + tail
+
+
+def measure(func, response, repeat, **kwargs):
+    """
+    Returns the best time (in seconds) of repeat calls of func and the data returned by the last call
+    """
+    best = None
+    for _ in range(repeat):
+        data = dict(zip(FIELDS, [[] for _ in range(len(FIELDS))]))
+        start = time.perf_counter()
+        data, _ = func(response, data, 'rss', CONFIG, **kwargs)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, data
+
+
+if __name__ == '__main__':
+    n_items = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    n_new = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    repeat = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+    with open(os.path.join(FIXTURES_PATH, 'rss.xml'), 'rb') as f:
+        response = Response(large_feed(f.read(), n_items))
+
+    feedparser_time, feedparser_data = measure(SubSteps.rss, response, repeat)
+    fast_time, fast_data = measure(SubSteps.rss_fast, response, repeat)
+    for key in ['title', 'summary', 'date', 'link', 'type', 'source']:
+        assert feedparser_data[key] == fast_data[key], f'Results differ in {key} field'
+
+    # all items except the first n_new ones are already stored
+    with tempfile.TemporaryDirectory() as path:
+        index = SeenIndex(path=path, filename='seen_index', max_items=n_items)
+    index.filter(dict([(key, values[n_new:]) for key, values in fast_data.items()]))
+    incremental_time, incremental_data = measure(SubSteps.rss_fast, response, repeat, seen=index.seen)
+    assert incremental_data['title'][:n_new] == fast_data['title'][:n_new]
+
+    print(f'items: {len(fast_data["title"])} ({len(response.content) / 2 ** 20:.1f} MB)')
+    print(f'feedparser: {feedparser_time * 1000:.1f} ms')
+    print(f'rss_fast: {fast_time * 1000:.1f} ms ({feedparser_time / fast_time:.1f}x)')
+    print(f'rss_fast with {n_new} new items: {incremental_time * 1000:.1f} ms '
+          f'({feedparser_time / incremental_time:.1f}x, {len(incremental_data["title"])} items read)')
@@ -0,0 +1,76 @@
+import os
+import re
+import sys
+import time
+from bs4 import BeautifulSoup
+
+dir_path = os.path.abspath(os.path.join(__file__, "../.."))
+sys.path.append(os.path.join(dir_path, "src"))
+
+from parsers import SubSteps
+
+FIXTURES_PATH = os.path.join(dir_path, "bench", "fixtures")
+FIELDS = ['title', 'summary', 'date', 'link', 'type', 'source', 'date_parsed']
+
+
+class Response:
+    """
+    Stand-in for requests.Response with a saved page
+    """
+    def __init__(self, text, status_code=200):
+        self.text = text
+        self.content = text.encode('utf8')
+        self.status_code = status_code
+
+
+def thebell_legacy(response, data, source, config=None):
+    """
+    Previous implementation of SubSteps.thebell (each item is converted back to a string and parsed
+    again for each of its fields)
+    """
+    bs = BeautifulSoup(response.text, "lxml")
+    status_code = str(response.status_code)
+
+    texts = [str(k) for k in bs.find_all('div', class_=['line-widget ng-star-inserted'])]
+    data['title'] = [BeautifulSoup(text, "lxml").find('div', attrs={'class': re.compile(r"text text-33")}) for text in texts]
+    data['summary'] = [None for text in texts]
+    data['type'] = [BeautifulSoup(text, "lxml").find('div', attrs={'class': re.compile(r"category category-33")}) for text in texts]
+    data['date'] = [BeautifulSoup(text, "lxml").find('div', attrs={'class': re.compile(r"time time-33")}) for text in texts]
+
+    for key in ['title', 'summary', 'type', 'date']:
+        data[key] = [item.text if item is not None else None for item in data[key]]
+
+    data['link'] = [None for _ in range(len(data['title']))]
+    data['source'] = [source for _ in range(len(data['title']))]
+    return data, status_code
+
+
+def measure(func, response, repeat):
+    """
+    Returns the best time (in seconds) of repeat calls of func and the data returned by the last call
+    """
+    best = None
+    for _ in range(repeat):
+        data = dict(zip(FIELDS, [[] for _ in range(len(FIELDS))]))
+        start = time.perf_counter()
+        data, _ = func(response, data, 'thebell')
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, data
+
+
+if __name__ == '__main__':
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    with open(os.path.join(FIXTURES_PATH, 'thebell.html'), 'r', encoding='utf8') as f:
+        response = Response(f.read())
+
+    legacy_time, legacy_data = measure(thebell_legacy, response, repeat)
+    new_time, new_data = measure(SubSteps.thebell, response, repeat)
+
+    for key in ['title', 'summary', 'date', 'link', 'type', 'source']:
+        assert legacy_data[key] == new_data[key], f'Results differ in {key} field'
+
+    print(f'items: {len(new_data["title"])}')
+    print(f'legacy: {legacy_time * 1000:.1f} ms')
+    print(f'single pass: {new_time * 1000:.1f} ms')
+    print(f'speedup: {legacy_time / new_time:.1f}x')
@@ -0,0 +1,83 @@
+import contextlib
+import copy
+import os
+import sys
+import tempfile
+
+dir_path = os.path.abspath(os.path.join(__file__, "../.."))
+sys.path.append(os.path.join(dir_path, "src"))
+
+from collector import Collector, configs
+from polling import AdaptivePoller
+from bench_collect import read_fixtures
+from mock_server import MockServer
+
+
+def make_collector(server, path, log_writer, seen_index=True):
+    """
+    Returns collector of two feeds of the local server (rss feed and TheBell page) with folders in path
+    """
+    configs_ = copy.deepcopy(configs)
+    k = configs['parser_type'].index('thebell')
+    configs_['source|url|requires_proxy'] = [['rss', server.url(0, 'rss', 'rss'), False],
+                                             ['thebell', server.url(1, 'thebell', 'thebell'), False]]
+    configs_['parser_type'] = ['rss', 'thebell']
+    configs_['parser_config'] = dict([(key, [values[0], values[k]]) for key, values in configs['parser_config'].items()])
+    configs_['seen_index']['enabled'] = seen_index
+    configs_['fingerprints']['enabled'] = True
+    configs_['log_writer']['enabled'] = log_writer
+    folders = {}
+    for name in ['storage', 'log', 'configs']:
+        folders[name] = os.path.join(path, name)
+        os.makedirs(folders[name], exist_ok=True)
+    return Collector(configs_, storage_path=folders['storage'], log_path=folders['log'], configs_path=folders['configs'])
+
+
+def add_item(server):
+    """
+    Adds a new item to the beginning of rss feed of the server
+    """
+    body, content_type = server.fixtures['rss']
+    item = body[body.index(b'<item>'):body.index(b'</item>') + len(b'</item>')]
+    new_item = item.replace(b'<link>', b'<link>' + str(len(body)).encode() + b'-', 1)
+    server.fixtures['rss'] = (body.replace(item, new_item + item, 1), content_type)
+
+
+if __name__ == '__main__':
+    # rates must be learnt from logs of two runs (json lines of log writer and csv log)
+    for log_writer in [True, False]:
+        server = MockServer(fixtures=read_fixtures(), n_hosts=2, n_live_proxies=0, n_dead_proxies=0)
+        with tempfile.TemporaryDirectory() as path:
+            for _ in range(2):
+                collector = make_collector(server, path, log_writer)
+                with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                    collector.run(ids=collector.feeds.by_kind['no_proxy'])
+                add_item(server)
+
+            poller = AdaptivePoller(min_interval=60, max_interval=86400, target_new_items=10)
+            n_rows = poller.load_history(path=os.path.join(path, 'log'), filename=configs['log_filename']['no_proxy'])
+        server.close()
+
+        assert n_rows == 4, f'{n_rows} rows with NEW and TIME columns instead of 4'
+        assert sorted(poller.rates.keys()) == ['rss', 'thebell'], f'rates are not learnt: {poller.rates}'
+        assert poller.rates['rss'] > 0 and poller.rates['thebell'] == 0, f'wrong rates: {poller.rates}'
+        print(f'{"json lines" if log_writer else "csv log"}: '
+              f'{", ".join([f"{source}: {rate:.0f} items/h" for source, rate in poller.rates.items()])}')
+
+    # without seen index only tries of unchanged pages (UNCHANGED status code of the 2nd and 3rd runs) are used
+    server = MockServer(fixtures=read_fixtures(), n_hosts=2, n_live_proxies=0, n_dead_proxies=0)
+    with tempfile.TemporaryDirectory() as path:
+        for _ in range(3):
+            collector = make_collector(server, path, log_writer=True, seen_index=False)
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                new_items = collector.run(ids=collector.feeds.by_kind['no_proxy'])
+        assert new_items == {'rss': 0, 'thebell': 0}, f'unchanged pages are not counted: {new_items}'
+
+        poller = AdaptivePoller(min_interval=60, max_interval=86400, target_new_items=10)
+        n_rows = poller.load_history(path=os.path.join(path, 'log'), filename=configs['log_filename']['no_proxy'])
+    server.close()
+
+    assert n_rows == 4, f'{n_rows} rows of unchanged pages instead of 4'
+    assert poller.rates == {'rss': 0, 'thebell': 0}, f'wrong rates: {poller.rates}'
+    assert poller.interval('rss') == poller.max_interval, 'quiet source is not backed off'
+    print(f'unchanged pages: {", ".join([f"{source}: {rate:.0f} items/h" for source, rate in poller.rates.items()])}')
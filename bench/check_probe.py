@@ -0,0 +1,47 @@
+import os
+import sys
+import tempfile
+
+dir_path = os.path.abspath(os.path.join(__file__, "../.."))
+sys.path.append(os.path.join(dir_path, "src"))
+
+from probe import probe_proxy, probe_proxies
+from proxy_store import ProxyStore
+from bench_collect import read_fixtures
+from mock_server import MockServer
+
+
+if __name__ == '__main__':
+    # live proxies open tunnels, plain ones refuse CONNECT (but forward http requests), dead ones refuse connections
+    server = MockServer(fixtures=read_fixtures(), n_hosts=1, n_live_proxies=2, n_dead_proxies=2, n_plain_proxies=2,
+                        certfile=os.path.join(dir_path, 'bench', 'fixtures', 'localhost.pem'))
+    proxies = [proxy['https'] for proxy in server.proxies()]
+    test_urls = {'https': f'{server.tls_host}/rss/rss', 'http': server.url(0, 'rss', 'rss')}
+    expected = {'https': server.live_proxies, 'http': server.plain_proxies + server.live_proxies}
+
+    for scheme, test_url in test_urls.items():
+        for proxy in proxies:
+            alive, latency, error = probe_proxy(proxy, test_url, timeout=1, verify=False)
+            assert alive == (proxy in expected[scheme]), f'{scheme}: {proxy} alive={alive} ({error})'
+            assert (latency is not None) == alive, f'{scheme}: {proxy} latency={latency}'
+            print(f'{scheme}: {proxy} {"alive" if alive else "failed"} {error}')
+
+        with tempfile.TemporaryDirectory() as path:
+            store = ProxyStore(path=path, filename='proxy_store')
+            alive = probe_proxies(proxies, test_url, timeout=1, verify=False, proxy_store=store)
+            assert alive == expected[scheme], f'{scheme}: {alive} instead of {expected[scheme]}'
+            assert sorted(store.stats.keys()) == sorted(proxies), f'{scheme}: results of {sorted(store.stats.keys())}'
+            assert all([len(store.stats[proxy]['latencies']) == int(proxy in alive) for proxy in proxies]), \
+                f'{scheme}: latencies are lost'
+            assert all([store.stats[proxy]['consecutive_failures'] == int(proxy not in alive) for proxy in proxies]), \
+                f'{scheme}: failures are lost'
+
+            # failures are recorded until proxies are evicted, nothing is recorded if the test endpoint is down
+            for _ in range(store.max_failures - 1):
+                probe_proxies(proxies, test_url, timeout=1, verify=False, proxy_store=store)
+            assert sorted(store.evicted.keys()) == sorted(set(proxies) - set(alive)), f'{scheme}: {store.evicted}'
+            store.stats[alive[0]]['consecutive_failures'] = store.max_failures - 1
+            assert probe_proxies(alive, server.url(0, 'rss', 'rss', fail=503).replace('http:', scheme + ':'),
+                                 timeout=1, verify=False, proxy_store=store) == []
+            assert alive[0] in store.stats, f'{scheme}: proxy is evicted due to an outage of the test endpoint'
+    server.close()
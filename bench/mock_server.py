@@ -0,0 +1,221 @@
+import hashlib
+import socket
+import ssl
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+
+class FeedHandler(BaseHTTPRequestHandler):
+    """
+    Serves saved pages by path /<fixture>/<feed> with the behaviour chosen by query parameters:
+        - delay=<seconds> - the response is sent after delay
+        - fail=<status> - the response always has the specified status code
+        - flaky=<n> - the first n requests of the path get 503 status code
+        - limit=<n> - the first n requests of the path get 429 status code with Retry-After header
+        - retry_after=<seconds> - value of Retry-After header (1 by default)
+        - etag=1 - ETag header is sent, requests with the current ETag in If-None-Match get 304 status code
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def send(self, status_code, body=b'', headers=None):
+        self.send_response(status_code)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = dict([(key, values[0]) for key, values in parse_qs(url.query).items()])
+        with self.server.lock:
+            count = self.server.counts.get(self.path, 0)
+            self.server.counts[self.path] = count + 1
+
+        if 'delay' in params:
+            time.sleep(float(params['delay']))
+        if 'fail' in params:
+            return self.send(int(params['fail']))
+        if count < int(params.get('flaky', 0)):
+            return self.send(503)
+        if count < int(params.get('limit', 0)):
+            return self.send(429, headers={'Retry-After': params.get('retry_after', '1')})
+
+        fixture = url.path.strip('/').split('/')[0]
+        if fixture not in self.server.fixtures:
+            return self.send(404)
+        body, content_type = self.server.fixtures[fixture]
+        if params.get('etag') == '1':
+            etag = f'"{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+            if self.headers.get('If-None-Match') == etag:
+                return self.send(304, headers={'ETag': etag})
+            return self.send(200, body, {'Content-Type': content_type, 'ETag': etag})
+        self.send(200, body, {'Content-Type': content_type})
+
+
+class ProxyHandler(BaseHTTPRequestHandler):
+    """
+    Forwards plain http requests (proxy requests have absolute urls in the request line) and opens tunnels
+    requested with CONNECT (unless tunnels are disabled for the server, then CONNECT gets 403 status code)
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    @staticmethod
+    def pipe(src, dst):
+        """
+        Copies bytes from socket src to socket dst until src is closed
+        """
+        try:
+            while True:
+                chunk = src.recv(65536)
+                if not chunk:
+                    break
+                dst.sendall(chunk)
+        except OSError:
+            pass
+        finally:
+            try:
+                dst.shutdown(socket.SHUT_WR)
+            except OSError:
+                pass
+
+    def do_CONNECT(self):
+        self.close_connection = True
+        if not self.server.tunnels:
+            self.send_response(403)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        host, port = self.path.rsplit(':', 1)
+        try:
+            upstream = socket.create_connection((host, int(port)), timeout=30)
+        except OSError:
+            self.send_response(502)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200, 'Connection established')
+        self.end_headers()
+        with upstream:
+            thread = threading.Thread(target=self.pipe, args=(upstream, self.connection), daemon=True)
+            thread.start()
+            self.pipe(self.connection, upstream)
+            thread.join()
+
+    def do_GET(self):
+        request = urllib.request.Request(self.path, headers=dict([(key, value) for key, value in self.headers.items()
+                                                                   if key.lower() not in ['proxy-connection', 'connection']]))
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                status_code, headers, body = response.status, response.headers, response.read()
+        except urllib.error.HTTPError as e:
+            status_code, headers, body = e.code, e.headers, e.read()
+
+        self.send_response(status_code)
+        for key, value in headers.items():
+            if key.lower() not in ['content-length', 'connection', 'transfer-encoding']:
+                self.send_header(key, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class MockServer:
+    """
+    Local http servers for benchmarks: several feed servers (each of them is a separate host for parsers),
+    a pool of live and dead proxies and, optionally, proxies which refuse CONNECT requests and a feed server
+    with TLS (to check tunnels through proxies)
+
+    Parameters
+    ----------
+    fixtures : dict
+        Saved pages in format d[name] = (body, content type)
+
+    n_hosts : int
+        Number of feed servers
+
+    n_live_proxies : int
+        Number of working proxies
+
+    n_dead_proxies : int
+        Number of proxies refusing connections
+
+    n_plain_proxies : int
+        Number of proxies which forward plain http requests but refuse CONNECT requests
+
+    certfile : string or None
+        Path to the file with certificate and private key of the feed server with TLS
+        (the server is not started if None)
+    """
+    def __init__(self, fixtures, n_hosts=4, n_live_proxies=2, n_dead_proxies=2, n_plain_proxies=0, certfile=None):
+        self.fixtures = fixtures
+        self.servers = []
+        self.hosts = [self.start(FeedHandler) for _ in range(n_hosts)]
+        self.live_proxies = [self.start(ProxyHandler) for _ in range(n_live_proxies)]
+        self.dead_proxies = [self.dead_address() for _ in range(n_dead_proxies)]
+        self.plain_proxies = [self.start(ProxyHandler, tunnels=False) for _ in range(n_plain_proxies)]
+        self.tls_host = self.start(FeedHandler, certfile=certfile) if certfile is not None else None
+
+    def start(self, handler, tunnels=True, certfile=None):
+        """
+        Starts server with handler in a background thread and returns its address
+        (TLS is used if certfile is specified)
+        """
+        server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        server.daemon_threads = True
+        server.fixtures = self.fixtures
+        server.counts = {}
+        server.lock = threading.Lock()
+        server.tunnels = tunnels
+        if certfile is not None:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(certfile)
+            server.socket = context.wrap_socket(server.socket, server_side=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.servers.append(server)
+        return f"{'https' if certfile is not None else 'http'}://127.0.0.1:{server.server_port}"
+
+    @staticmethod
+    def dead_address():
+        """
+        Returns address of a closed port
+        """
+        with socket.socket() as s:
+            s.bind(('127.0.0.1', 0))
+            return f'http://127.0.0.1:{s.getsockname()[1]}'
+
+    def url(self, host_id, fixture, feed, **params):
+        """
+        Returns url of fixture served by host number host_id (see FeedHandler for params)
+        """
+        query = '&'.join([f'{key}={value}' for key, value in params.items()])
+        return f'{self.hosts[host_id % len(self.hosts)]}/{fixture}/{feed}' + (f'?{query}' if query else '')
+
+    def proxies(self):
+        """
+        Returns all proxies (dead ones first, then the ones refusing CONNECT) in format of requests library
+        """
+        return [{'http': proxy, 'https': proxy} for proxy in self.dead_proxies + self.plain_proxies + self.live_proxies]
+
+    def reset(self):
+        """
+        Resets counts of requests, so that flaky and rate-limited endpoints fail again
+        """
+        for server in self.servers:
+            with server.lock:
+                server.counts.clear()
+
+    def close(self):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
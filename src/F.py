@@ -1,28 +1,144 @@
 import csv
+import datetime
 import yaml
 from proxy_parse import ProxyParser
 import os
-from pathlib import Path
+import tempfile
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+UMASK = os.umask(0)
+os.umask(UMASK)
+
+
+@contextmanager
+def locked(f):
+    """
+    Holds exclusive lock of open file f, so that other processes (e.g. an overlapping run) wait before
+    writing to it. Buffered data is written before the lock is released. On systems without fcntl
+    the file is not locked
+    """
+    if fcntl is None:
+        yield f
+        f.flush()
+        return
+    fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+    try:
+        yield f
+        f.flush()
+    finally:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+@contextmanager
+def run_lock(file, wait=False):
+    """
+    Holds exclusive lock of file for the whole run, so that overlapping runs (e.g. a Cron Job started while
+    the previous one is still running) do not write data, log and state at the same time.
+    The lock is released by the system if the process dies. On systems without fcntl nothing is locked
+
+    Parameters
+    ----------
+    file : string
+        Path to the lock file (created with its folder if it does not exist)
+
+    wait : bool
+        Whether to wait until the active run finishes instead of giving up right away
+
+    Yields
+    ------
+    acquired : bool
+        Whether the lock has been acquired (False if another run holds it and wait is False)
+    """
+    if fcntl is None:
+        yield True
+        return
+    os.makedirs(os.path.dirname(file) or '.', exist_ok=True)
+    with open(file, 'a') as f:
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | (0 if wait else fcntl.LOCK_NB))
+        except BlockingIOError:
+            acquired = False
+        else:
+            acquired = True
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+@contextmanager
+def atomic_write(file, mode='w', encoding=None, newline=None):
+    """
+    Opens a temporary file next to file for writing and replaces file with it when writing is finished,
+    so that file is either fully rewritten or left untouched if the process fails in the middle of writing
+
+    Parameters
+    ----------
+    file : string
+        Path to the file
+
+    mode : string
+        'w' or 'wb'
+
+    encoding, newline :
+        Same as in open function
+    """
+    folder, name = os.path.split(file)
+    fd, tmp = tempfile.mkstemp(dir=folder or '.', prefix=f'.{name}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, mode, encoding=encoding, newline=newline) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp, os.stat(file).st_mode if os.path.isfile(file) else 0o666 & ~UMASK)
+        os.replace(tmp, file)
+    except BaseException:
+        if os.path.isfile(tmp):
+            os.remove(tmp)
+        raise
+
+
+def check_header(file, fields):
+    """
+    Moves csv file aside (to file name with the current time, e.g. log.20230501120000.csv) if its header differs
+    from fields, so that rows with other columns are not appended under the old header
+
+    Parameters
+    ----------
+    file : string
+        Path to the csv file
+
+    fields : array-like of strings
+        Columns of rows to be appended
+    """
+    if not os.path.isfile(file) or os.path.getsize(file) == 0:
+        return
+    with open(file, 'r', encoding='utf8', newline='') as f:
+        header = next(csv.reader(f), [])
+    if header != [str(field) for field in fields]:
+        root, extension = os.path.splitext(file)
+        os.replace(file, f"{root}.{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}{extension}")
+
 
 def save_as_txt(file, path, filename):
-    with open(f'{path}/{filename}.txt', 'a') as f:
+    with open(f'{path}/{filename}.txt', 'a') as f, locked(f):
         for item in file:
             f.write(f'{item}\n')
 
 
 def save_as_csv(file, path, filename):
-    f = Path(f'{path}/{filename}.csv')
-    if f.is_file():
-        with open(f'{path}/{filename}.csv', 'a', encoding='utf8', newline='') as a:
-            w = csv.writer(a)
-            if os.stat(f'{path}/{filename}.csv').st_size == 0:
-                w.writerow(file.keys())
-            w.writerows(zip(*file.values()))
-    else:
-        with open(f'{path}/{filename}.csv', 'a', encoding='utf8', newline='') as a:
-            w = csv.writer(a)
+    check_header(f'{path}/{filename}.csv', file.keys())
+    with open(f'{path}/{filename}.csv', 'a', encoding='utf8', newline='') as a, locked(a):
+        w = csv.writer(a)
+        if os.fstat(a.fileno()).st_size == 0:
             w.writerow(file.keys())
-            w.writerows(zip(*file.values()))
+        w.writerows(zip(*file.values()))
 
 
 def read_yaml(path, filename):
@@ -32,7 +148,7 @@ def read_yaml(path, filename):
 
 
 def save_as_yaml(file, path, filename):
-    with open(f'{path}/{filename}.yaml', 'a') as w:
+    with atomic_write(f'{path}/{filename}.yaml') as w:
         yaml.dump(file, w, default_flow_style=False)
 
 
@@ -7,6 +7,7 @@ from F import read_yaml
 ###                               Reading file with configs                             ###
 
 dir_path = os.path.abspath(os.path.join(__file__ ,"../.."))
+LOG_PATH = os.path.join(dir_path ,"log")
 CONFIGS_PATH = os.path.join(dir_path ,"configs")
 
 configs = read_yaml(path=CONFIGS_PATH,
@@ -16,5 +17,25 @@ configs = read_yaml(path=CONFIGS_PATH,
 ###                  Outputting the time of a next call of parsing job                  ###
 
 for it, job in enumerate(CronTab(user=configs['username'])):
+    if str(job.slices) == '@reboot':
+        print(f'{it+1} | Job: {job} | Next call: on reboot')
+        continue
     sch = job.schedule(date_from=datetime.datetime.now())
-    print(f'{it+1} | Job: {job} | Next call: {sch.get_next()}')
\ No newline at end of file
+    print(f'{it+1} | Job: {job} | Next call: {sch.get_next()}')
+
+
+###########################################################################################
+###             Outputting the time of a next call of each url by the daemon            ###
+
+state_file = f"{LOG_PATH}/{configs['daemon']['state_filename']}.yaml"
+if os.path.isfile(state_file):
+    state = read_yaml(path=LOG_PATH,
+                      filename=configs['daemon']['state_filename'])
+    try:
+        os.kill(state['pid'], 0)
+        status = 'running'
+    except OSError:
+        status = 'not running'
+    print(f"Daemon (pid {state['pid']}, started {state['started']}): {status}")
+    for it, (source, next_call) in enumerate(state['next_calls'].items()):
+        print(f'{it+1} | Source: {source} | Next call: {next_call}')
\ No newline at end of file
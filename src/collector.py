@@ -1,6 +1,20 @@
-from parsers import Parser, ParserWithProxy
-from F import save_as_csv, save_as_txt, gather_proxies, read_yaml, save_as_yaml, append_dict
+from parsers import Parser, ParserWithProxy, SubSteps
+from extractors import compile_extractors
+from feeds import compile_feeds
+from F import save_as_txt, gather_proxies, read_yaml, save_as_yaml, run_lock
+from proxy_store import ProxyStore
+from probe import probe_proxies
+from http_cache import ValidatorCache
+from seen_index import SeenIndex
+from fingerprints import FingerprintStore
+from sinks import make_sink
+from sessions import SessionPool
+from retry import RetryPolicy
+from metrics import Metrics
+from log_writer import LogWriter, rotate
+from polling import count_new
 import os
+import time
 
 ###########################################################################################
 ###                               Reading file with configs                             ###
@@ -13,86 +27,268 @@ CONFIGS_PATH = os.path.join(dir_path ,"configs")
 configs = read_yaml(path=CONFIGS_PATH,
                     filename='configs')
 
-PARSER_CONFIGS = [dict(zip(configs['parser_config'].keys(),
-                           [item[k] for item in configs['parser_config'].values()]))\
-                  for k in range(len(list(configs['parser_config'].values())[0]))]
-
 
 ###########################################################################################
-###                         Parsing urls with no proxy required                         ###
+###                                     Collector                                       ###
 
-parser = Parser(waiting_time=configs['waiting_time']['no_proxy'],
-                timeout_between_requests=configs['timeout_between_requests']['no_proxy'])
+class Collector:
+    """
+    Parses news from urls specified in configs and saves data, log and state (proxies, http validators,
+    seen items, fingerprints of responses). Parsers, http sessions, caches and proxies are kept between runs, so that the same collector can be
+    run repeatedly (see daemon.py)
 
-NO_PROXY_IDS = [it for it, item in enumerate(configs['source|url|requires_proxy']) if not item[2]]
+    Parameters
+    ----------
+    configs : dict
+        Configs (see configs.yaml)
 
-data1, log_csv1, log_txt1 = parser.search(urls=[item[1] for it, item in enumerate(configs['source|url|requires_proxy']) if it in NO_PROXY_IDS],
-                                       sources=[item[0] for it, item in enumerate(configs['source|url|requires_proxy']) if it in NO_PROXY_IDS],
-                                       configs=[item for it, item in enumerate(PARSER_CONFIGS) if it in NO_PROXY_IDS],
-                                       fields=configs['data_fields'],
-                                       log_fields=configs['log_fields'],
-                                       parser_types=[item for it, item in enumerate(configs['parser_type']) if it in NO_PROXY_IDS],
-                                       number_of_tries=configs['number_of_tries']['no_proxy'])
+    storage_path, log_path, configs_path : string
+        Folders with data and state (http validators, seen items, fingerprints), with log and with proxies
+        (another set of folders is used by each worker of sharded collection, see sharding.py)
+    """
+    def __init__(self, configs, storage_path=STORAGE_PATH, log_path=LOG_PATH, configs_path=CONFIGS_PATH):
+        self.configs = configs
+        self.storage_path = storage_path
+        self.log_path = log_path
+        self.configs_path = configs_path
+        SubSteps.register(compile_extractors(configs['custom_parsers']))
+        self.feeds = compile_feeds(configs)
+        self.load_state()
 
+        self.session_pool = SessionPool(backend=configs['sessions']['backend'],
+                                        pool_connections=configs['sessions']['pool_connections'],
+                                        pool_maxsize=configs['sessions']['pool_maxsize'],
+                                        max_sessions=configs['sessions']['max_sessions']) if configs['sessions']['enabled'] else None
 
-###########################################################################################
-###                                Saving data and log                                  ###
+        self.retry_policies = dict([(kind, RetryPolicy(base_delay=configs['retry_policy']['base_delay'],
+                                                       max_delay=configs['retry_policy']['max_delay'],
+                                                       jitter=configs['retry_policy']['jitter'],
+                                                       retry_statuses=configs['retry_policy']['retry_statuses'][kind])
+                                     if configs['retry_policy']['enabled'] else None)
+                                    for kind in ['no_proxy', 'proxy']])
 
-save_as_csv(file=log_csv1,
-            path=LOG_PATH,
-            filename=configs['log_filename']['no_proxy'])
-save_as_txt(file=log_txt1,
-            path=LOG_PATH,
-            filename=configs['log_filename']['no_proxy'])
-save_as_csv(file=data1,
-            path=STORAGE_PATH,
-            filename=configs['data_filename']['no_proxy'])
+        self.metrics = Metrics(path=self.log_path,
+                               filename=configs['metrics']['filename'],
+                               prometheus=configs['metrics']['prometheus']) if configs['metrics']['enabled'] else None
 
+        self.log_writers = dict([(kind, LogWriter(path=self.log_path,
+                                                  filename=configs['log_filename'][kind],
+                                                  text_view=configs['log_writer']['text_view'],
+                                                  widths=configs['log_writer']['widths'],
+                                                  max_bytes=configs['log_writer']['max_bytes'],
+                                                  backup_count=configs['log_writer']['backup_count'],
+                                                  compress=configs['log_writer']['compress'])
+                                  if configs['log_writer']['enabled'] else None)
+                                 for kind in ['no_proxy', 'proxy']])
 
-###########################################################################################
-###                           Gathering a new set of proxies                            ###
+        self.proxy_store = ProxyStore(path=self.configs_path,
+                                      **configs['proxy_store'])
+        self.proxies_updated = None
 
-old_proxies = read_yaml(path=CONFIGS_PATH,
-                        filename='proxies')
-new_proxies = gather_proxies()
-proxies = append_dict(old_proxies, new_proxies)
+        self.parsers = {'no_proxy': Parser(waiting_time=configs['waiting_time']['no_proxy'],
+                                           timeout_between_requests=configs['timeout_between_requests']['no_proxy'],
+                                           max_workers=configs['max_workers']['no_proxy'],
+                                           cache=self.cache,
+                                           seen_index=self.seen_index,
+                                           fingerprints=self.fingerprints,
+                                           session_pool=self.session_pool,
+                                           retry_policy=self.retry_policies['no_proxy'],
+                                           metrics=self.metrics,
+                                           log_writer=self.log_writers['no_proxy']),
+                        'proxy': ParserWithProxy(waiting_time=configs['waiting_time']['proxy'],
+                                                 timeout_between_requests=configs['timeout_between_requests']['proxy'],
+                                                 proxies=[],
+                                                 proxies_per_url=configs['proxies_per_url'],
+                                                 proxy_store=self.proxy_store,
+                                                 max_workers=configs['max_workers']['proxy'],
+                                                 cache=self.cache,
+                                                 seen_index=self.seen_index,
+                                                 fingerprints=self.fingerprints,
+                                                 session_pool=self.session_pool,
+                                                 retry_policy=self.retry_policies['proxy'],
+                                                 metrics=self.metrics,
+                                                 log_writer=self.log_writers['proxy'])}
 
-PROXIES = [dict(zip(['http', 'https'], [item, item])) for item in proxies['items']]
+    def load_state(self):
+        """
+        Reads http validators, seen items and fingerprints from their files
+        """
+        configs = self.configs
+        self.cache = ValidatorCache(path=self.storage_path,
+                                    filename=configs['http_cache']['filename']) if configs['http_cache']['enabled'] else None
 
+        self.seen_index = SeenIndex(path=self.storage_path,
+                                    filename=configs['seen_index']['filename'],
+                                    max_items=configs['seen_index']['max_items']) if configs['seen_index']['enabled'] else None
 
-###########################################################################################
-###                           Parsing urls with proxy required                          ###
+        self.fingerprints = FingerprintStore(path=self.storage_path,
+                                             filename=configs['fingerprints']['filename']) if configs['fingerprints']['enabled'] else None
+
+    def rollback(self):
+        """
+        Drops changes of http validators, seen items and fingerprints made since they have been saved
+        (they are read from their files again and passed to the parsers)
+        """
+        self.load_state()
+        for parser in self.parsers.values():
+            parser.cache = self.cache
+            parser.seen_index = self.seen_index
+            parser.fingerprints = self.fingerprints
+
+    def update_proxies(self):
+        """
+        Gathers a new set of proxies, checks whether they are alive and passes them to the parser with proxy
+        """
+        old_proxies = read_yaml(path=self.configs_path,
+                                filename='proxies')
+        new_proxies = gather_proxies()
+        self.proxy_store.add(old_proxies['items'] + new_proxies['items'])
+
+        proxies = self.proxy_store.rank()
+        if self.configs['proxy_probe']['enabled']:
+            proxies = probe_proxies(proxies=proxies,
+                                    test_url=self.configs['proxy_probe']['test_url'],
+                                    timeout=self.configs['proxy_probe']['timeout'],
+                                    max_workers=self.configs['proxy_probe']['max_workers'],
+                                    proxy_store=self.proxy_store)
+            proxies = self.proxy_store.rank(proxies)
+
+        self.parsers['proxy'].proxies = [dict(zip(['http', 'https'], [item, item])) for item in proxies]
+        self.proxies_updated = time.monotonic()
+
+    def parse(self, ids, kind):
+        """
+        Parses the specified urls and saves data and log
+
+        Parameters
+        ----------
+        ids : array-like of ints
+            Indices of urls (in source|url|requires_proxy) to be parsed
 
-parser = ParserWithProxy(waiting_time=configs['waiting_time']['proxy'],
-                         timeout_between_requests=configs['timeout_between_requests']['proxy'],
-                         proxies=PROXIES)
+        kind : string
+            'no_proxy' or 'proxy'
 
-PROXY_IDS = [it for it, item in enumerate(configs['source|url|requires_proxy']) if item[2]]
+        Returns
+        -------
+        log_csv : dict
+            Log of parsing process of the urls
+        """
+        configs = self.configs
+        parser = self.parsers[kind]
+        sink = make_sink(backend=configs['sink']['backend'],
+                         path=self.storage_path,
+                         filename=configs['data_filename'][kind],
+                         fields=configs['data_fields'],
+                         batch_size=configs['streaming']['batch_size'],
+                         partition_by=configs['sink']['partition_by'])
+        parser.sink = sink if configs['streaming']['enabled'] else None
 
-data2, log_csv2, log_txt2, proxies = \
-                         parser.search(urls=[item[1] for it, item in enumerate(configs['source|url|requires_proxy']) if it in PROXY_IDS],
-                                       sources=[item[0] for it, item in enumerate(configs['source|url|requires_proxy']) if it in PROXY_IDS],
-                                       configs=[item for it, item in enumerate(PARSER_CONFIGS) if it in PROXY_IDS],
-                                       fields=configs['data_fields'],
-                                       log_fields=configs['log_fields'],
-                                       parser_types=[item for it, item in enumerate(configs['parser_type']) if it in PROXY_IDS],
-                                       number_of_tries=configs['number_of_tries']['proxy'])
+        try:
+            output = parser.search(fields=configs['data_fields'],
+                                   log_fields=configs['log_fields'],
+                                   number_of_tries=configs['number_of_tries'][kind],
+                                   **self.feeds.columns(ids))
+            data, log_csv, log_txt = output[:3]
+
+            if kind == 'proxy':
+                save_as_yaml(file=output[3],
+                             path=self.configs_path,
+                             filename='proxies')
+
+            if configs['log_writer']['enabled'] and configs['sink']['backend'] == 'csv':
+                rotate(file=f"{self.log_path}/{configs['log_filename'][kind]}.csv",
+                       max_bytes=configs['log_writer']['max_bytes'],
+                       backup_count=configs['log_writer']['backup_count'],
+                       compress=configs['log_writer']['compress'])
+            with make_sink(backend=configs['sink']['backend'],
+                           path=self.log_path,
+                           filename=configs['log_filename'][kind],
+                           fields=log_csv.keys(),
+                           partition_by=configs['sink']['partition_by']) as log_sink:
+                log_sink.write(log_csv)
+            if not configs['log_writer']['enabled']:
+                save_as_txt(file=log_txt,
+                            path=self.log_path,
+                            filename=configs['log_filename'][kind])
+            if not configs['streaming']['enabled']:
+                sink.write(data)
+        finally:
+            sink.close()
+            parser.sink = None
+        return log_csv
+
+    def save_state(self):
+        """
+        Saves proxies health, http validators, seen items, fingerprints and metrics
+        """
+        self.proxy_store.save()
+        if self.metrics is not None:
+            self.metrics.save()
+        if self.cache is not None:
+            self.cache.save()
+        if self.seen_index is not None:
+            self.seen_index.save()
+        if self.fingerprints is not None:
+            self.fingerprints.save()
+
+    def run(self, ids=None, proxy_refresh=0):
+        """
+        Parses the specified urls (urls with no proxy required go first) and saves data, log and state.
+        State is saved after each of the two phases, so that it matches the data already written if the other
+        phase fails. If a phase fails, its state is saved only when data is streamed, otherwise no data is written
+        and changes of the state made by the phase are dropped (see rollback), so that its items are not taken
+        as already stored by the next run of the same collector (see daemon.py)
+
+        Parameters
+        ----------
+        ids : array-like of ints or None
+            Indices of urls (in source|url|requires_proxy) to be parsed (all urls if None)
+
+        proxy_refresh : int or float
+            Time (in seconds) during which gathered proxies are reused (0 means that a new set of proxies
+            is gathered on each run)
+
+        Returns
+        -------
+        new_items : dict
+            Number of new items of each parsed source in format d[source] = number (see count_new,
+            only sources with unchanged pages are counted if seen_index is disabled)
+        """
+        ids = self.feeds.split(ids)
+        logs = []
+
+        for kind in ['no_proxy', 'proxy']:
+            if len(ids[kind]) == 0:
+                continue
+            if kind == 'proxy' and (self.proxies_updated is None or
+                                    time.monotonic() - self.proxies_updated >= proxy_refresh):
+                self.update_proxies()
+            try:
+                logs.append(self.parse(ids[kind], kind))
+            except Exception:
+                if self.configs['streaming']['enabled']:
+                    self.save_state()
+                else:
+                    self.rollback()
+                raise
+            self.save_state()
+
+        new_items = {}
+        for log in logs:
+            for source, status_code, new in zip(log['source'], log['STATUS_CODE'], log['NEW']):
+                n_new = count_new(status_code, new)
+                if n_new is not None:
+                    new_items[source] = new_items.get(source, 0) + n_new
+        return new_items
 
 
 ###########################################################################################
-###                   Saving data, log and successfully worked proxies                  ###
-
-os.remove(f'{CONFIGS_PATH}/proxies.yaml')
-save_as_yaml(file=proxies,
-             path=CONFIGS_PATH,
-             filename='proxies')
-
-save_as_csv(file=log_csv2,
-            path=LOG_PATH,
-            filename=configs['log_filename']['proxy'])
-save_as_txt(file=log_txt2,
-            path=LOG_PATH,
-            filename=configs['log_filename']['proxy'])
-save_as_csv(file=data2,
-            path=STORAGE_PATH,
-            filename=configs['data_filename']['proxy'])
\ No newline at end of file
+###                                 Parsing all urls                                    ###
+
+if __name__ == '__main__':
+    with run_lock(file=f"{STORAGE_PATH}/{configs['run_lock']['filename']}.lock",
+                  wait=configs['run_lock']['wait']) as acquired:
+        if acquired:
+            Collector(configs).run()
+        else:
+            print('Another run is active, the run is skipped')
@@ -0,0 +1,127 @@
+import datetime
+import os
+import time
+import traceback
+import yaml
+from croniter import croniter
+from collector import Collector, configs, STORAGE_PATH, LOG_PATH
+from polling import AdaptivePoller
+from F import atomic_write, run_lock
+
+
+class Daemon:
+    """
+    Long-running collector which calls parsing of each url according to its own schedule.
+    Parsers, caches and proxies are kept in memory between calls, the time of the next call of each url
+    is saved to the state file (see checker.py)
+
+    Parameters
+    ----------
+    collector : Collector
+        Collector to be used
+
+    schedule : string
+        Cron expression used for urls without their own schedule
+
+    feed_schedule : dict
+        Cron expressions for particular sources in format d[source] = expression
+
+    proxy_refresh : int or float
+        Time (in seconds) during which gathered proxies are reused
+
+    state_file : string
+        Path to the state file
+
+    poller : AdaptivePoller or None
+        If specified, urls without their own schedule are called with intervals chosen by poller
+        (according to the observed rate of new items of their sources)
+    """
+    def __init__(self, collector, schedule, feed_schedule, proxy_refresh, state_file, poller=None):
+        self.collector = collector
+        self.proxy_refresh = proxy_refresh
+        self.state_file = state_file
+        self.poller = poller
+        self.adaptive = [poller is not None and feed.source not in (feed_schedule or {}) for feed in collector.feeds]
+        self.expressions = [(feed_schedule or {}).get(feed.source, schedule) for feed in collector.feeds]
+        self.started = datetime.datetime.now()
+        self.next_calls = dict([(it, self.next_call(it, self.started)) for it in range(len(collector.feeds))])
+
+    def next_call(self, it, now):
+        """
+        Returns the time of the next call of url after now
+        """
+        if self.adaptive[it]:
+            interval = self.poller.interval(self.collector.feeds[it].source)
+            if interval is not None:
+                return now + datetime.timedelta(seconds=interval)
+        return croniter(self.expressions[it], now).get_next(datetime.datetime)
+
+    def save_state(self):
+        """
+        Saves the time of the next call of each url to the state file
+        """
+        state = {'pid': os.getpid(),
+                 'started': self.started,
+                 'updated': datetime.datetime.now(),
+                 'next_calls': dict([(self.collector.feeds[it].source, next_call)
+                                     for it, next_call in self.next_calls.items()])}
+        with atomic_write(self.state_file) as w:
+            yaml.dump(state, w, default_flow_style=False, sort_keys=False)
+
+    def run_once(self):
+        """
+        Waits for the nearest call and parses urls which are due
+        """
+        self.save_state()
+        wake_up = min(self.next_calls.values())
+        time.sleep(max((wake_up - datetime.datetime.now()).total_seconds(), 0))
+
+        now = datetime.datetime.now()
+        ids = [it for it, next_call in self.next_calls.items() if next_call <= now]
+        print(f'{now} | Parsing: {", ".join([self.collector.feeds[it].source for it in ids])}')
+        try:
+            new_items = self.collector.run(ids=ids, proxy_refresh=self.proxy_refresh)
+        except Exception:
+            traceback.print_exc()
+            new_items = {}
+
+        if self.poller is not None:
+            for source, n_new in new_items.items():
+                self.poller.observe(source, n_new, now)
+
+        now = datetime.datetime.now()
+        for it in ids:
+            self.next_calls[it] = self.next_call(it, now)
+
+    def run_forever(self):
+        while True:
+            self.run_once()
+
+
+###########################################################################################
+###                                 Running the daemon                                  ###
+
+if __name__ == '__main__':
+    poller = None
+    if configs['adaptive_polling']['enabled']:
+        poller = AdaptivePoller(min_interval=configs['adaptive_polling']['min_interval'],
+                                max_interval=configs['adaptive_polling']['max_interval'],
+                                target_new_items=configs['adaptive_polling']['target_new_items'],
+                                smoothing=configs['adaptive_polling']['smoothing'])
+        for kind in ['no_proxy', 'proxy']:
+            poller.load_history(path=LOG_PATH,
+                                filename=configs['log_filename'][kind])
+        print(f'{datetime.datetime.now()} | Rates learnt from log: {len(poller.rates)} sources')
+
+    with run_lock(file=f"{STORAGE_PATH}/{configs['run_lock']['filename']}.lock",
+                  wait=configs['run_lock']['wait']) as acquired:
+        if not acquired:
+            print(f'{datetime.datetime.now()} | Another run is active, the daemon is not started')
+        else:
+            daemon = Daemon(collector=Collector(configs),
+                            schedule=configs['schedule'],
+                            feed_schedule=configs['daemon']['feed_schedule'],
+                            proxy_refresh=configs['daemon']['proxy_refresh'],
+                            state_file=f"{LOG_PATH}/{configs['daemon']['state_filename']}.yaml",
+                            poller=poller)
+            daemon.run_forever()
@@ -0,0 +1,115 @@
+import datetime
+import soupsieve
+import yaml
+from bs4 import BeautifulSoup
+from lxml import etree, html
+
+
+class SelectorExtractor:
+    """
+    Custom parser defined by selectors (see custom_parsers in configs.yaml).
+    Selectors are compiled once, when the extractor is created, and the extractor can be used
+    in the same way as methods of SubSteps class
+
+    Parameters
+    ----------
+    name : string
+        Name of the parser (used as parser_type)
+
+    item : string
+        Selector of news items
+
+    fields : dict
+        Selectors of fields inside an item. Value is either a selector (text of the first matched element
+        is taken) or a dict with selector and attr keys (value of attribute of the first matched element is taken)
+
+    selector_type : string
+        Type of selectors ('css' or 'xpath')
+    """
+    def __init__(self, name, item, fields, selector_type='css'):
+        if selector_type not in ['css', 'xpath']:
+            raise ValueError(f'Unknown selector type of {name} parser: {selector_type}')
+        self.name = name
+        self.selector_type = selector_type
+        self.item = self.compile(item)
+        self.fields = {}
+        for key, spec in fields.items():
+            spec = spec if isinstance(spec, dict) else {'selector': spec}
+            self.fields[key] = (self.compile(spec['selector']), spec.get('attr'))
+
+    def compile(self, selector):
+        """
+        Returns compiled selector
+        """
+        if self.selector_type == 'css':
+            return soupsieve.compile(selector)
+        return etree.XPath(selector)
+
+    def value(self, item, selector, attr):
+        """
+        Returns text or attribute value of the first element of item matched by selector (None if there is no match)
+        """
+        if self.selector_type == 'css':
+            element = selector.select_one(item)
+            if element is None:
+                return None
+            return element.get(attr) if attr is not None else element.text
+
+        elements = selector(item)
+        if len(elements) == 0:
+            return None
+        element = elements[0]
+        if not isinstance(element, etree._Element):
+            return str(element)
+        return element.get(attr) if attr is not None else element.text_content()
+
+    def __call__(self, response, data, source, config=None):
+        """
+        Parser of pages with news items
+        """
+        if self.selector_type == 'css':
+            items = self.item.select(BeautifulSoup(response.text, "lxml"))
+        else:
+            items = self.item(html.fromstring(response.content))
+        status_code = str(response.status_code)
+
+        for key in [key for key in data.keys() if key not in ['source', 'date_parsed']]:
+            if key in self.fields:
+                data[key] = [self.value(item, *self.fields[key]) for item in items]
+            else:
+                data[key] = [None for _ in items]
+
+        data['source'] = [source for _ in items]
+        data['date_parsed'] = [datetime.datetime.now() for _ in items]
+
+        return data, status_code
+
+
+compiled = {}
+
+
+def compile_extractors(custom_parsers):
+    """
+    Compiles custom parsers defined in configs. Compiled extractors are cached, so that the same definition
+    is compiled only once per process
+
+    Parameters
+    ----------
+    custom_parsers : dict
+        Definitions of custom parsers in format d[name] = {'selector_type': ..., 'item': ..., 'fields': {...}}
+
+    Returns
+    -------
+    extractors : dict
+        Dictionary in format d[name] = SelectorExtractor
+    """
+    extractors = {}
+    for name, definition in (custom_parsers or {}).items():
+        key = (name, yaml.safe_dump(definition, sort_keys=True))
+        if key not in compiled:
+            compiled[key] = SelectorExtractor(name=name,
+                                              item=definition['item'],
+                                              fields=definition['fields'],
+                                              selector_type=definition.get('selector_type', 'css'))
+        extractors[name] = compiled[key]
+    return extractors
@@ -0,0 +1,195 @@
+from parsers import SubSteps
+
+
+class Feed:
+    """
+    Url to be parsed with everything needed to parse it (see source|url|requires_proxy, parser_type
+    and parser_config in configs.yaml)
+
+    Parameters
+    ----------
+    id : int
+        Index of url in source|url|requires_proxy
+
+    source : string
+        Source name of url
+
+    url : string
+        Url to be parsed
+
+    requires_proxy : bool
+        Whether a proxy must be used
+
+    parser_type : string
+        Type of parser to be used
+
+    config : dict
+        Config for parser (shared by feeds with the same config)
+    """
+    __slots__ = ['id', 'source', 'url', 'requires_proxy', 'parser_type', 'config']
+
+    def __init__(self, id, source, url, requires_proxy, parser_type, config):
+        self.id = id
+        self.source = source
+        self.url = url
+        self.requires_proxy = requires_proxy
+        self.parser_type = parser_type
+        self.config = config
+
+    @property
+    def kind(self):
+        """
+        Returns 'proxy' or 'no_proxy'
+        """
+        return 'proxy' if self.requires_proxy else 'no_proxy'
+
+    def __repr__(self):
+        return f'Feed({self.id}, {self.source!r}, {self.url!r}, {self.kind}, {self.parser_type})'
+
+
+class FeedRegistry:
+    """
+    Feeds specified in configs, indexed by kind ('no_proxy' or 'proxy') and by parser type.
+    Feeds are accessed by their indices in source|url|requires_proxy
+
+    Parameters
+    ----------
+    feeds : list of Feeds
+        Feeds in order of their indices
+    """
+    def __init__(self, feeds):
+        self.feeds = feeds
+        self.by_kind = {'no_proxy': [], 'proxy': []}
+        self.by_parser_type = {}
+        for feed in feeds:
+            self.by_kind[feed.kind].append(feed.id)
+            self.by_parser_type.setdefault(feed.parser_type, []).append(feed.id)
+
+    def __len__(self):
+        return len(self.feeds)
+
+    def __getitem__(self, it):
+        return self.feeds[it]
+
+    def __iter__(self):
+        return iter(self.feeds)
+
+    def split(self, ids=None):
+        """
+        Splits feeds by kind
+
+        Parameters
+        ----------
+        ids : array-like of ints or None
+            Indices of feeds (all feeds if None)
+
+        Returns
+        -------
+        ids : dict
+            Indices of feeds in format d[kind] = list of ints (in the order of the input indices)
+        """
+        if ids is None:
+            return dict([(kind, list(values)) for kind, values in self.by_kind.items()])
+        out = {'no_proxy': [], 'proxy': []}
+        for it in ids:
+            out[self.feeds[it].kind].append(it)
+        return out
+
+    def columns(self, ids):
+        """
+        Returns urls, sources, configs and parser types of feeds as arguments of search method of parsers
+
+        Parameters
+        ----------
+        ids : array-like of ints
+            Indices of feeds
+        """
+        feeds = [self.feeds[it] for it in ids]
+        return {'urls': [feed.url for feed in feeds],
+                'sources': [feed.source for feed in feeds],
+                'configs': [feed.config for feed in feeds],
+                'parser_types': [feed.parser_type for feed in feeds]}
+
+
+def validate(configs):
+    """
+    Returns list of errors in source|url|requires_proxy, parser_type and parser_config sections of configs
+    (they are parallel lists, which must have the same length)
+    """
+    errors = []
+    items = configs['source|url|requires_proxy'] or []
+    parser_types = configs['parser_type'] or []
+    parser_configs = configs['parser_config'] or {}
+    custom_parsers = configs.get('custom_parsers') or {}
+
+    for it, item in enumerate(items):
+        if not isinstance(item, list) or len(item) != 3:
+            errors.append(f'source|url|requires_proxy[{it}] must be [source, url, requires_proxy], got {item!r}')
+            continue
+        source, url, requires_proxy = item
+        if not isinstance(source, str) or source == '':
+            errors.append(f'source|url|requires_proxy[{it}]: source must be a non-empty string, got {source!r}')
+        if not isinstance(url, str) or not url.startswith(('http://', 'https://')):
+            errors.append(f'source|url|requires_proxy[{it}]: url must start with http:// or https://, got {url!r}')
+        if not isinstance(requires_proxy, bool):
+            errors.append(f'source|url|requires_proxy[{it}]: requires_proxy must be True or False, got {requires_proxy!r}')
+
+    if len(parser_types) != len(items):
+        errors.append(f'parser_type has {len(parser_types)} items, but source|url|requires_proxy has {len(items)}')
+    for it, parser_type in enumerate(parser_types):
+        if parser_type not in custom_parsers and parser_type not in SubSteps.extractors and \
+                not callable(getattr(SubSteps, str(parser_type), None)):
+            errors.append(f'parser_type[{it}]: unknown parser type {parser_type!r}')
+
+    for key, values in parser_configs.items():
+        if len(values or []) != len(items):
+            errors.append(f'parser_config.{key} has {len(values or [])} items, '
+                          f'but source|url|requires_proxy has {len(items)}')
+    return errors
+
+
+compiled = {}
+
+
+def compile_feeds(configs):
+    """
+    Validates feeds specified in configs and compiles them to registry. Compiled registry is cached,
+    so that the same configs are compiled only once per process (configs must not be changed after that)
+
+    Parameters
+    ----------
+    configs : dict
+        Configs (see configs.yaml)
+
+    Returns
+    -------
+    registry : FeedRegistry
+
+    Raises
+    ------
+    ValueError
+        If feeds are specified incorrectly (all errors are listed in the message)
+    """
+    key = id(configs)
+    if key in compiled and compiled[key][0] is configs:
+        return compiled[key][1]
+
+    errors = validate(configs)
+    if len(errors) > 0:
+        raise ValueError('Feeds are specified incorrectly in configs:\n' + '\n'.join(errors))
+
+    parser_configs = configs['parser_config'] or {}
+    shared_configs = {}
+    feeds = []
+    for it, ((source, url, requires_proxy), parser_type) in enumerate(zip(configs['source|url|requires_proxy'] or [],
+                                                                          configs['parser_type'] or [])):
+        config = tuple([(key, values[it]) for key, values in parser_configs.items()])
+        feeds.append(Feed(id=it,
+                          source=source,
+                          url=url,
+                          requires_proxy=requires_proxy,
+                          parser_type=parser_type,
+                          config=shared_configs.setdefault(repr(config), dict(config))))
+
+    compiled[key] = (configs, FeedRegistry(feeds))
+    return compiled[key][1]
@@ -0,0 +1,121 @@
+import hashlib
+import json
+import os
+import threading
+from F import atomic_write
+
+
+class FingerprintStore:
+    """
+    Persistent store of fingerprints of responses, which is used to skip feeds whose body has not changed since
+    the previous run even if they send no http validators. For each url 8-byte hash of the body and hashes
+    of its items are kept: if the body hash matches, the page is not parsed at all, otherwise only the items
+    which have changed are kept
+
+    Parameters
+    ----------
+    path : string
+        Path to the folder with the store file
+
+    filename : string
+        Name of the store file (without extension)
+    """
+    # fields filled at the time of parsing, which are not taken into account in hashes of items
+    volatile_fields = ['date_parsed']
+
+    def __init__(self, path, filename):
+        self.file = f'{path}/{filename}.json'
+        self.lock = threading.Lock()
+        self.fingerprints = {}
+        if os.path.isfile(self.file):
+            with open(self.file, 'r', encoding='utf8') as f:
+                self.fingerprints = json.load(f)
+
+    @staticmethod
+    def key(content):
+        """
+        Returns 8-byte hash of body (bytes) as hex string
+        """
+        return hashlib.blake2b(content, digest_size=8).hexdigest()
+
+    def unchanged(self, url, body_hash):
+        """
+        Returns whether body of url has the same hash as at the last successful try
+        """
+        with self.lock:
+            item = self.fingerprints.get(url)
+        return item is not None and item['body'] == body_hash
+
+    def changed(self, url, data):
+        """
+        Drops items of url which have not changed since the last successful try
+
+        Parameters
+        ----------
+        url : string
+            Requested url
+
+        data : dict
+            Dictionary with fields retrieved from url
+
+        Returns
+        -------
+        data : dict
+            Dictionary with changed items only
+
+        entries : list of strings
+            Hashes of all items of data (to be passed to update method)
+        """
+        rows = list(zip(*[values for field, values in data.items() if field not in self.volatile_fields]))
+        entries = [self.key('\x1f'.join([str(value) for value in row]).encode('utf8')) for row in rows]
+        with self.lock:
+            item = self.fingerprints.get(url)
+        old_entries = set(item['entries']) if item is not None else set()
+
+        changed_ids = [it for it, entry in enumerate(entries) if entry not in old_entries]
+        if len(changed_ids) < len(entries):
+            data = dict([(field, [values[it] for it in changed_ids]) for field, values in data.items()])
+        return data, entries
+
+    def update(self, url, body_hash, entries):
+        """
+        Stores fingerprints of successfully parsed response of url
+
+        Parameters
+        ----------
+        url : string
+            Requested url
+
+        body_hash : string
+            Hash of the body (see key method)
+
+        entries : list of strings
+            Hashes of items (see changed method)
+        """
+        with self.lock:
+            self.fingerprints[url] = {'body': body_hash, 'entries': entries}
+
+    def merge(self, other, urls):
+        """
+        Takes fingerprints of urls from another store (e.g. of a worker of sharded collection which has parsed them)
+
+        Parameters
+        ----------
+        other : FingerprintStore
+            Store to be merged
+
+        urls : array-like of strings
+            Urls whose fingerprints are taken from other
+        """
+        with self.lock:
+            for url in urls:
+                if url in other.fingerprints:
+                    self.fingerprints[url] = other.fingerprints[url]
+
+    def save(self):
+        """
+        Saves the store to its file
+        """
+        with self.lock:
+            with atomic_write(self.file, encoding='utf8') as w:
+                json.dump(self.fingerprints, w)
@@ -0,0 +1,102 @@
+import os
+import threading
+import yaml
+from F import atomic_write
+
+
+class ValidatorCache:
+    """
+    On-disk cache of http validators (ETag and Last-Modified headers) of urls, which is used to make
+    conditional requests, so that unchanged pages are not downloaded and parsed again
+
+    Parameters
+    ----------
+    path : string
+        Path to the folder with the cache file
+
+    filename : string
+        Name of the cache file (without extension)
+    """
+    def __init__(self, path, filename):
+        self.file = f'{path}/{filename}.yaml'
+        self.lock = threading.Lock()
+        self.validators = {}
+        if os.path.isfile(self.file):
+            with open(self.file, 'r') as f:
+                self.validators = yaml.safe_load(f) or {}
+
+    def headers(self, url):
+        """
+        Returns headers for conditional request to url
+
+        Returns
+        -------
+        headers : dict
+            If-None-Match and If-Modified-Since headers (empty if url has no cached validators)
+        """
+        with self.lock:
+            item = self.validators.get(url, {})
+        headers = {}
+        if item.get('etag'):
+            headers['If-None-Match'] = item['etag']
+        if item.get('last_modified'):
+            headers['If-Modified-Since'] = item['last_modified']
+        return headers
+
+    @staticmethod
+    def extract(response):
+        """
+        Returns validators of response (to be passed to update method)
+
+        Returns
+        -------
+        item : dict
+            ETag and Last-Modified headers in format {'etag': value, 'last_modified': value}
+        """
+        return {'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified')}
+
+    def update(self, url, item):
+        """
+        Stores validators of successfully parsed and stored response of url
+
+        Parameters
+        ----------
+        url : string
+            Requested url
+
+        item : dict
+            Validators of the response (see extract method)
+        """
+        with self.lock:
+            if item['etag'] or item['last_modified']:
+                self.validators[url] = item
+            else:
+                self.validators.pop(url, None)
+
+    def merge(self, other, urls):
+        """
+        Takes validators of urls from another cache (e.g. of a worker of sharded collection which has parsed them)
+
+        Parameters
+        ----------
+        other : ValidatorCache
+            Cache to be merged
+
+        urls : array-like of strings
+            Urls whose validators are taken from other
+        """
+        with self.lock:
+            for url in urls:
+                if url in other.validators:
+                    self.validators[url] = other.validators[url]
+                else:
+                    self.validators.pop(url, None)
+
+    def save(self):
+        """
+        Saves the cache to its file
+        """
+        with self.lock:
+            with atomic_write(self.file) as w:
+                yaml.dump(self.validators, w, default_flow_style=False)
@@ -0,0 +1,153 @@
+import datetime
+import gzip
+import json
+import os
+import shutil
+from F import atomic_write, locked
+
+
+def rotate(file, max_bytes, backup_count=5, compress=True):
+    """
+    Rotates file if it is larger than max_bytes: file is renamed to file.1 (file.1.gz if compress is True),
+    file.1 to file.2 and so on, files older than backup_count are removed
+
+    Parameters
+    ----------
+    file : string
+        Path to the file
+
+    max_bytes : int
+        Maximum size of the file (in bytes)
+
+    backup_count : int
+        Number of old files kept
+
+    compress : bool
+        Whether old files should be compressed with gzip
+    """
+    if not os.path.isfile(file) or os.path.getsize(file) < max_bytes:
+        return
+    if backup_count <= 0:
+        os.remove(file)
+        return
+
+    extension = '.gz' if compress else ''
+    for k in range(backup_count - 1, 0, -1):
+        if os.path.isfile(f'{file}.{k}{extension}'):
+            os.replace(f'{file}.{k}{extension}', f'{file}.{k+1}{extension}')
+    if compress:
+        with open(file, 'rb') as r, atomic_write(f'{file}.1.gz', 'wb') as f, gzip.open(f, 'wb') as w:
+            shutil.copyfileobj(r, w)
+        os.remove(file)
+    else:
+        os.replace(file, f'{file}.1')
+
+
+class LogWriter:
+    """
+    Writes log of parsing process row by row as soon as each try is finished: json lines (filename.jsonl)
+    and, optionally, a table with fixed widths of columns (filename.txt). Files are rotated when a run starts
+    (see rotate function)
+
+    Parameters
+    ----------
+    path : string
+        Path to the folder where log is saved
+
+    filename : string
+        Name of the files (without extension)
+
+    text_view : bool
+        Whether the table should be written
+
+    widths : dict or None
+        Widths of columns of the table in format d[column] = width (longer values are cut),
+        the other columns are 8 characters wide (or as wide as their names), TIME column is 21 characters wide
+
+    max_bytes : int
+        Maximum size of the files (in bytes)
+
+    backup_count : int
+        Number of old files kept
+
+    compress : bool
+        Whether old files should be compressed with gzip
+    """
+    def __init__(self, path, filename, text_view=True, widths=None, max_bytes=10485760, backup_count=5, compress=True):
+        self.path = path
+        self.filename = filename
+        self.text_view = text_view
+        self.widths = dict([('TIME', 21)] + list((widths or {}).items()))
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.compress = compress
+        self.columns = None
+        self.files = {}
+
+    def start(self, columns):
+        """
+        Rotates files if necessary, opens them and writes the header of the table
+
+        Parameters
+        ----------
+        columns : array-like of strings
+            Columns of log (TIME column is added)
+        """
+        self.close()
+        self.columns = list(columns) + ['TIME']
+        extensions = ['jsonl'] + ['txt'] * self.text_view
+        for extension in extensions:
+            file = f'{self.path}/{self.filename}.{extension}'
+            rotate(file, self.max_bytes, self.backup_count, self.compress)
+            self.files[extension] = open(file, 'a', encoding='utf8')
+
+        if self.text_view:
+            self.lengths = [max(len(column) + 2, self.widths.get(column, 8)) for column in self.columns]
+            self.separator = '+' + '+'.join(['-' * length for length in self.lengths]) + '+'
+            with locked(self.files['txt']) as f:
+                f.write('\n'.join(['=' * 100,
+                                   f'TIME: {datetime.datetime.now()}',
+                                   self.separator,
+                                   self.line(self.columns),
+                                   self.separator]) + '\n')
+
+    def line(self, values):
+        """
+        Returns row of the table with values centered in their cells
+        """
+        cells = []
+        for value, length in zip(values, self.lengths):
+            value = str(value)
+            if len(value) > length:
+                value = value[:length - 3] + '...'
+            spacing = ' ' * ((length - len(value)) // 2)
+            cells.append((spacing + value + spacing).ljust(length))
+        return '|' + '|'.join(cells) + '|'
+
+    def write(self, log):
+        """
+        Writes log of a single try
+
+        Parameters
+        ----------
+        log : dict
+            Log of parsing process for url (one-element lists of strings)
+        """
+        row = dict([(column, log[column][0] if column in log else '') for column in self.columns[:-1]])
+        row['TIME'] = datetime.datetime.now().isoformat(sep=' ', timespec='seconds')
+
+        with locked(self.files['jsonl']) as f:
+            f.write(json.dumps(row, ensure_ascii=False) + '\n')
+        if self.text_view:
+            with locked(self.files['txt']) as f:
+                f.write(self.line(row.values()) + '\n' + self.separator + '\n')
+
+    def close(self):
+        """
+        Closes files
+        """
+        if 'txt' in self.files:
+            self.files['txt'].write('\n')
+        for file in self.files.values():
+            file.close()
+        self.files = {}
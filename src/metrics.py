@@ -0,0 +1,154 @@
+import datetime
+import json
+import threading
+from F import atomic_write, locked
+
+
+class Metrics:
+    """
+    Collects timings of each try (connect, download, parsing, writing to the sink), number of downloaded bytes,
+    proxy and number of retries and exports them as json lines (one line per try) and as a text file in
+    Prometheus format (totals per source, stage and proxy, can be read by textfile collector of node_exporter)
+
+    Parameters
+    ----------
+    path : string
+        Path to the folder where metrics are saved
+
+    filename : string
+        Name of the files (without extension, .jsonl and .prom are used)
+
+    prometheus : bool
+        Whether the file in Prometheus format should be written
+    """
+    stages = ['connect', 'download', 'parse', 'sink']
+
+    def __init__(self, path, filename, prometheus=True):
+        self.path = path
+        self.filename = filename
+        self.prometheus = prometheus
+        self.lock = threading.Lock()
+        self.rows = []
+        self.stage_totals = {}
+        self.source_totals = {}
+        self.proxy_totals = {}
+
+    def record(self, source, url, proxy, retries, outcome, log, meta):
+        """
+        Records a try
+
+        Parameters
+        ----------
+        source : string
+            Source name of url
+
+        url : string
+            Url requested
+
+        proxy : string or None
+            Proxy used
+
+        retries : int
+            Number of previous tries of url during the run
+
+        outcome : string
+            Decision for the try ('ok', 'retry' or 'give up')
+
+        log : dict
+            Log of parsing process for url
+
+        meta : dict
+            Details of the try filled by step method (status_code, bytes, <stage>_time)
+        """
+        row = {'time': datetime.datetime.now().isoformat(timespec='milliseconds'),
+               'source': source,
+               'url': url,
+               'proxy': proxy,
+               'try': int(log['TRY'][0]),
+               'retries': retries,
+               'outcome': outcome,
+               'status_code': log['STATUS_CODE'][0] or None,
+               'error': log['ERROR'][0] or None,
+               'items': int(log['title'][0]) if log['title'][0].isdigit() else 0,
+               'bytes': meta.get('bytes', 0)}
+        for stage in self.stages:
+            row[f'{stage}_time'] = meta.get(f'{stage}_time')
+        row['total_time'] = sum([row[f'{stage}_time'] or 0 for stage in self.stages])
+        self.add(row)
+
+    def add(self, row):
+        """
+        Adds a recorded try (row of json lines file, e.g. of a worker of sharded collection) to metrics
+        """
+        source, proxy, outcome, retries = row['source'], row['proxy'], row['outcome'], row['retries']
+        with self.lock:
+            self.rows.append(row)
+            for stage in self.stages:
+                if row[f'{stage}_time'] is not None:
+                    total = self.stage_totals.setdefault((source, stage), [0, 0])
+                    total[0] += row[f'{stage}_time']
+                    total[1] += 1
+            total = self.source_totals.setdefault(source, {'tries': 0, 'failures': 0, 'retries': 0, 'bytes': 0, 'items': 0})
+            total['tries'] += 1
+            total['failures'] += outcome != 'ok'
+            total['retries'] += retries > 0
+            total['bytes'] += row['bytes']
+            total['items'] += row['items']
+            if proxy is not None:
+                total = self.proxy_totals.setdefault(proxy, {'tries': 0, 'failures': 0, 'seconds': 0})
+                total['tries'] += 1
+                total['failures'] += outcome != 'ok'
+                total['seconds'] += row['total_time']
+
+    @staticmethod
+    def labels(**kwargs):
+        """
+        Returns labels in Prometheus format
+        """
+        values = [(k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for k, v in kwargs.items()]
+        return '{' + ','.join([f'{k}="{v}"' for k, v in values]) + '}'
+
+    def exposition(self):
+        """
+        Returns totals in Prometheus text format
+        """
+        lines = ['# HELP news_parser_stage_seconds Time spent in stage of tries',
+                 '# TYPE news_parser_stage_seconds summary']
+        for (source, stage), (seconds, count) in self.stage_totals.items():
+            lines.append(f'news_parser_stage_seconds_sum{self.labels(source=source, stage=stage)} {seconds:.6f}')
+            lines.append(f'news_parser_stage_seconds_count{self.labels(source=source, stage=stage)} {count}')
+
+        for key, description in [('tries', 'Number of tries'),
+                                  ('failures', 'Number of tries with nothing parsed'),
+                                  ('retries', 'Number of repeated tries'),
+                                  ('bytes', 'Number of downloaded bytes'),
+                                  ('items', 'Number of parsed items')]:
+            lines.append(f'# HELP news_parser_{key}_total {description}')
+            lines.append(f'# TYPE news_parser_{key}_total counter')
+            for source, total in self.source_totals.items():
+                lines.append(f'news_parser_{key}_total{self.labels(source=source)} {total[key]}')
+
+        for key, description in [('tries', 'Number of tries made through proxy'),
+                                 ('failures', 'Number of tries through proxy with nothing parsed'),
+                                 ('seconds', 'Time spent in tries through proxy')]:
+            lines.append(f'# HELP news_parser_proxy_{key}_total {description}')
+            lines.append(f'# TYPE news_parser_proxy_{key}_total counter')
+            for proxy, total in self.proxy_totals.items():
+                lines.append(f'news_parser_proxy_{key}_total{self.labels(proxy=proxy)} {total[key]:g}')
+        return '\n'.join(lines) + '\n'
+
+    def save(self):
+        """
+        Appends recorded tries to json lines file and rewrites the file in Prometheus format
+        """
+        with self.lock:
+            rows, self.rows = self.rows, []
+            exposition = self.exposition() if self.prometheus else None
+
+        with open(f'{self.path}/{self.filename}.jsonl', 'a', encoding='utf8') as w, locked(w):
+            for row in rows:
+                w.write(json.dumps(row, ensure_ascii=False) + '\n')
+
+        if exposition is not None:
+            with atomic_write(f'{self.path}/{self.filename}.prom', encoding='utf8') as w:
+                w.write(exposition)
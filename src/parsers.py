@@ -2,8 +2,15 @@ import feedparser
 import datetime
 import requests
 import time
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
+from lxml import etree
+from email.utils import parsedate_to_datetime
+import io
 import re
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
 from F import append_dict
 
 
@@ -21,13 +28,63 @@ class BaseParser:
 
    proxies : list of strings
          list of proxies to be used
+
+   max_workers : int
+         Number of hosts to be requested in parallel (1 means sequential requests).
+         Requests to the same host are always made sequentially with timeout_between_requests
+         between them
+
+   cache : ValidatorCache or None
+         Cache of http validators. If specified, conditional requests are made and unchanged
+         pages (304 status code) are not parsed
+
+   seen_index : SeenIndex or None
+         Index of already stored items. If specified, only new items are returned and the number
+         of them is logged in NEW column
+
+   sink : BaseSink or None
+         Storage for parsed data. If specified, data of each successful try is written to the sink
+         right away instead of being accumulated and returned by search method
+
+   session_pool : SessionPool or None
+         Pool of http sessions. If specified, requests are made with keep-alive sessions of the pool
+         (one per host and proxy), otherwise a new connection is made for each request
+
+   retry_policy : RetryPolicy or None
+         Policy of retries. If specified, only transient failures are retried (with growing delays) and
+         the decision for each try is logged in DECISION column, otherwise all failed urls are retried
+         in the next pass
+
+   metrics : Metrics or None
+         Collector of metrics. If specified, timings of stages, downloaded bytes, proxy and number of
+         retries of each try are recorded
+
+   log_writer : LogWriter or None
+         Writer of log. If specified, log of each try is written right away and search method
+         returns empty txt log instead of the table built by reform_log
+
+   fingerprints : FingerprintStore or None
+         Store of hashes of responses. If specified, pages with the same body as at the last successful
+         try are not parsed (UNCHANGED status code), only changed items of the other pages are kept
+         and the number of them is logged in CHANGED column
    """
-   def __init__(self, waiting_time, timeout_between_requests, proxies=None):
+   def __init__(self, waiting_time, timeout_between_requests, proxies=None, max_workers=1, cache=None,
+                seen_index=None, sink=None, session_pool=None, retry_policy=None, metrics=None, log_writer=None,
+                fingerprints=None):
       self.waiting_time = waiting_time
       self.timeout_between_requests = timeout_between_requests
       self.proxies = proxies
-
-   def step(self, try_id, it, url, source, config, fields, log_fields, parser_type, kwargs={}):
+      self.max_workers = max_workers
+      self.cache = cache
+      self.seen_index = seen_index
+      self.sink = sink
+      self.session_pool = session_pool
+      self.retry_policy = retry_policy
+      self.metrics = metrics
+      self.log_writer = log_writer
+      self.fingerprints = fingerprints
+
+   def step(self, try_id, it, url, source, config, fields, log_fields, parser_type, kwargs={}, meta=None):
       """
       Return parsed data and corresponding log for input url
 
@@ -60,6 +117,14 @@ class BaseParser:
       kwargs : dict
           kwargs for request.get function
 
+      meta : dict or None
+          Dictionary to be filled with details of the try: status_code, retry_after (value of Retry-After
+          header), error (exception raised), stage at which it has been raised ('request' or 'parse'),
+          bytes (size of the body), timings (in seconds) of the stages: connect_time (till headers
+          of the response are received), download_time (of the body) and parse_time, and fingerprints
+          of the response: body_hash and entries (see FingerprintStore), and its http validators
+          (see ValidatorCache)
+
       Returns
       -------
       data : dict
@@ -72,24 +137,318 @@ class BaseParser:
       log = dict(zip(log_fields, [[''] for _ in range(len(log_fields))]))
       log['source'][0] = source
       log['TRY'][0] = f'{try_id+1}'
+      for key in self.extra_log_fields():
+         log[key] = ['']
+      meta = {} if meta is None else meta
 
       try:
-         response = requests.get(url, timeout=self.waiting_time, **kwargs)
-         if f'{response.status_code}'[0] not in ['4', '5']:
-            data, status_code = getattr(SubSteps, parser_type)(response, data, source, config)
+         meta['stage'] = 'request'
+         start = time.monotonic()
+         headers = self.cache.headers(url) if self.cache is not None else {}
+         if self.session_pool is not None:
+            response = self.session_pool.get(url, timeout=self.waiting_time, headers=headers, stream=True, **kwargs)
+         else:
+            response = requests.get(url, timeout=self.waiting_time, headers=headers, stream=True, **kwargs)
+         meta['connect_time'] = time.monotonic() - start
+         start = time.monotonic()
+         meta['bytes'] = len(response.read() if hasattr(response, 'read') else response.content)
+         meta['download_time'] = time.monotonic() - start
+         if self.fingerprints is not None:
+            meta['body_hash'] = self.fingerprints.key(response.content)
+         meta['status_code'] = response.status_code
+         meta['retry_after'] = response.headers.get('Retry-After')
+         if response.status_code == 304:
+            log['STATUS_CODE'][0] = '304'
+
+         elif f'{response.status_code}'[0] not in ['4', '5'] and self.fingerprints is not None and \
+               self.fingerprints.unchanged(url, meta['body_hash']):
+            log['STATUS_CODE'][0] = 'UNCHANGED'
+            log['CHANGED'][0] = '0'
+
+         elif f'{response.status_code}'[0] not in ['4', '5']:
+            meta['stage'] = 'parse'
+            start = time.monotonic()
+            extra = {}
+            if self.seen_index is not None and parser_type in SubSteps.incremental:
+               extra['seen'] = self.seen_index.seen
+            data, status_code = SubSteps.get(parser_type)(response, data, source, config, **extra)
+            meta['parse_time'] = time.monotonic() - start
 
             log['STATUS_CODE'][0] = status_code
             for key in [f for f in log_fields if f not in ['STATUS_CODE', 'ERROR', 'source', 'TRY']]:
                log[key][0] = str(len([1 for item in data[key] if item is not None]))
 
+            if self.fingerprints is not None and not self.is_failed(log):
+               data, meta['entries'] = self.fingerprints.changed(url, data)
+               log['CHANGED'][0] = str(len(data['title']))
+
+            if self.cache is not None and not self.is_failed(log):
+               meta['validators'] = self.cache.extract(response)
+
          else:
             log['STATUS_CODE'][0] = f'{(response.status_code)}'
 
       except Exception as e:
          log['ERROR'][0] = str(e)
+         meta['error'] = e
+         if meta['stage'] == 'request' and 'connect_time' not in meta:
+            meta['connect_time'] = time.monotonic() - start
 
       return data, log
 
+   @staticmethod
+   def is_failed(log):
+      """
+      Returns whether the try logged in log has failed and should be repeated (nothing has been parsed
+      and the page has not been reported as unchanged by the server or by fingerprints)
+
+      Parameters
+      ----------
+      log : dict
+          Log of parsing process for a single url
+
+      Returns
+      -------
+      failed : bool
+      """
+      return log['title'] in [[''], ['0']] and log['STATUS_CODE'] not in [['304'], ['UNCHANGED']]
+
+   def decide(self, try_id, log, meta, last=False):
+      """
+      Returns decision for the try (see RetryPolicy). Without retry_policy all failed tries are
+      retried with no delay
+
+      Parameters
+      ----------
+      try_id : int
+          try number
+
+      log : dict
+          Log of parsing process for url
+
+      meta : dict
+          Details of the try filled by step method
+
+      last : bool
+          Whether there are no tries left
+
+      Returns
+      -------
+      outcome : string
+          'ok', 'retry' or 'give up'
+
+      delay : float
+          Delay (in seconds) before the next try
+      """
+      if self.retry_policy is None:
+         return ('retry' if self.is_failed(log) else 'ok'), 0
+      outcome, delay = self.retry_policy.decide(try_id, self.is_failed(log), log, meta)
+      if outcome == 'retry' and last:
+         log['DECISION'] = ['give up (no tries left)']
+      return outcome, delay
+
+   @staticmethod
+   def extra_log_fields():
+      """
+      Returns names of log columns filled by optional features of parser. The columns are always present
+      (empty if the feature is disabled), so that columns of log do not depend on settings
+      """
+      return ['CHANGED', 'NEW', 'DECISION']
+
+   def keep_new(self, data, log):
+      """
+      Drops already seen items from data of a successful try and logs the number of new items
+
+      Parameters
+      ----------
+      data : dict
+          Dictionary with fields retrieved from url
+
+      log : dict
+          Log of parsing process for url
+
+      Returns
+      -------
+      data : dict
+          Dictionary with new items only
+
+      log : dict
+          Log with NEW column filled
+      """
+      if self.seen_index is not None and not self.is_failed(log):
+         data, n_new = self.seen_index.filter(data)
+         log['NEW'][0] = str(n_new)
+      return data, log
+
+   def collect(self, data, data_):
+      """
+      Writes data of a successful try to the sink or appends it to the accumulated data if there is no sink
+
+      Parameters
+      ----------
+      data : dict
+          Accumulated data
+
+      data_ : dict
+          Data of a successful try
+
+      Returns
+      -------
+      data : dict
+          Accumulated data
+      """
+      if self.sink is not None:
+         self.sink.write(data_)
+         return data
+      return append_dict(data, data_)
+
+   def store(self, url, data, data_, meta):
+      """
+      Collects data of a successful try of url, records the time it took (sink_time in meta) and
+      stores fingerprints and http validators of the response (only after its data has been collected,
+      so that a page whose data has not been stored is not reported as unchanged next time)
+      """
+      start = time.monotonic()
+      data = self.collect(data, data_)
+      meta['sink_time'] = time.monotonic() - start
+      if self.cache is not None and 'validators' in meta:
+         self.cache.update(url, meta['validators'])
+      if self.fingerprints is not None and 'entries' in meta:
+         self.fingerprints.update(url, meta['body_hash'], meta['entries'])
+      return data
+
+   def report(self, url, source, proxy, retries, outcome, log, meta):
+      """
+      Records the try to metrics (if they are specified), see Metrics.record
+      """
+      if self.metrics is not None:
+         self.metrics.record(source, url, proxy, retries, outcome, log, meta)
+
+   def finish(self, log):
+      """
+      Flushes the sink, closes the log writer and returns log of all urls in csv and txt formats
+      (see search method)
+      """
+      if self.sink is not None:
+         self.sink.flush()
+      if self.log_writer is not None:
+         self.log_writer.close()
+         log_txt = []
+      else:
+         log_txt = self.reform_log(log)
+      log['TIME'] = [datetime.datetime.now() for _ in range(len(log[list(log.keys())[0]]))]
+      return log, log_txt
+
+   @staticmethod
+   def wait(it, not_before):
+      """
+      Waits until the earliest time of request of url number it (if it is specified in not_before)
+      """
+      if not_before is not None and it in not_before:
+         time.sleep(max(not_before[it] - time.monotonic(), 0))
+
+   def per_host(self, ids, urls, task):
+      """
+      Calls task for each of the specified urls. Urls of different hosts are processed in parallel
+      if max_workers > 1, urls of the same host are processed sequentially with timeout_between_requests
+      between them. An exception raised by task is re-raised in the calling thread (urls which have
+      not been started yet are skipped)
+
+      Parameters
+      ----------
+      ids : array-like of ints
+          Indices of urls to be processed
+
+      urls : array-like of strings
+          Set of urls (ids are indices in it)
+
+      task : callable
+          Function of index of url
+
+      Yields
+      ------
+      result :
+          Result of task for each of the specified urls in the order of completion
+      """
+      if len(ids) == 0:
+         return
+
+      if self.max_workers <= 1:
+         for it in ids:
+            yield task(it)
+            time.sleep(self.timeout_between_requests)
+         return
+
+      results = queue.Queue()
+      stop = threading.Event()
+
+      def run_host(host_ids):
+         try:
+            for it in host_ids:
+               if stop.is_set():
+                  return
+               results.put((task(it), None))
+               time.sleep(self.timeout_between_requests)
+         except BaseException as e:
+            results.put((None, e))
+
+      hosts = {}
+      for it in ids:
+         hosts.setdefault(urlparse(urls[it]).netloc, []).append(it)
+      with ThreadPoolExecutor(max_workers=min(self.max_workers, len(hosts))) as executor:
+         try:
+            for host_ids in hosts.values():
+               executor.submit(run_host, host_ids)
+            for _ in range(len(ids)):
+               result, error = results.get()
+               if error is not None:
+                  raise error
+               yield result
+         finally:
+            stop.set()
+
+   def run_pass(self, try_id, ids, urls, sources, configs, fields, log_fields, parser_types, kwargs={}, prefix='',
+                not_before=None):
+      """
+      Makes one try for each of the specified urls. Urls of different hosts are requested in parallel
+      if max_workers > 1, urls of the same host are requested sequentially with timeout_between_requests
+      between them. Urls are not requested before the time specified in not_before.
+      Results are yielded as soon as they are ready
+
+      Parameters
+      ----------
+      try_id : int
+          try number
+
+      ids : array-like of ints
+          Indices of urls to be parsed during this pass
+
+      urls, sources, configs, fields, log_fields, parser_types :
+          Same as in search method
+
+      kwargs : dict
+          kwargs for request.get function
+
+      prefix : string
+          Prefix for the progress line
+
+      not_before : dict or None
+          Earliest time (time.monotonic) of request of each url in format d[it] = time
+
+      Yields
+      ------
+      result : tuple
+          (it, data, log, meta) for each of the specified urls in the order of completion
+      """
+      def run_one(it):
+         self.wait(it, not_before)
+         print(f'{prefix}{try_id+1} | {it} | {sources[it]}')
+         meta = {}
+         data, log = self.step(try_id, it, urls[it], sources[it], configs[it], fields, log_fields,
+                               parser_types[it], kwargs, meta)
+         return it, data, log, meta
+
+      yield from self.per_host(ids, urls, run_one)
 
    def search(self, urls, sources, configs, fields, log_fields, parser_types, number_of_tries):
       """
@@ -121,36 +480,43 @@ class BaseParser:
       Returns
       -------
       data : dict
-          Dictionary with necessary fields retrieved from all urls
+          Dictionary with necessary fields retrieved from all urls (empty if sink is specified)
 
       log_csv : dict
           Log of parsing process of all urls (will be saved as csv)
 
       log_txt : list of strings
-          Log of parsing process of all urls (will be saved as txt)
+          Log of parsing process of all urls (will be saved as txt, empty if log_writer is specified)
       """
       data = dict(zip(fields, [[] for _ in range(len(fields))]))
-      log = dict(zip(log_fields, [[] for _ in range(len(log_fields))]))
+      log_columns = log_fields + self.extra_log_fields()
+      log = dict(zip(log_columns, [[] for _ in range(len(log_columns))]))
       ids = [k for k in range(len(urls))]
+      if self.log_writer is not None:
+         self.log_writer.start(log_columns)
+
+      not_before = {}
 
       for try_id in range(number_of_tries):
          new_ids = []
-         for it in ids:
-            print(f'{try_id+1} | {it} | {sources[it]}')
-            data_, log_ = self.step(try_id, it, urls[it], sources[it], configs[it], fields, log_fields, parser_types[it])
-            if log_['title'] in  [[''], ['0']]:
+         for it, data_, log_, meta in self.run_pass(try_id, ids, urls, sources, configs, fields, log_fields,
+                                                    parser_types, not_before=not_before):
+            data_, log_ = self.keep_new(data_, log_)
+            outcome, delay = self.decide(try_id, log_, meta, last=try_id+1 == number_of_tries)
+            if outcome == 'retry':
                new_ids.append(it)
-            else:
-               data = append_dict(data, data_)
+               not_before[it] = time.monotonic() + delay
+            elif outcome == 'ok':
+               data = self.store(urls[it], data, data_, meta)
+            self.report(urls[it], sources[it], None, try_id, outcome, log_, meta)
             log = append_dict(log, log_)
-            time.sleep(self.timeout_between_requests)
+            if self.log_writer is not None:
+               self.log_writer.write(log_)
          if len(new_ids) == 0:
             break
          ids = new_ids
 
-      log_txt = self.reform_log(log)
-      log['TIME'] = [datetime.datetime.now() for _ in range(len(log[list(log.keys())[0]]))]
-      log_csv = log
+      log_csv, log_txt = self.finish(log)
       return data, log_csv, log_txt
 
    @staticmethod
@@ -176,23 +542,19 @@ class BaseParser:
       L = [max(l1, l2)+2 for (l1, l2) in zip(L1, L2)]
 
       separator = "+"+'+'.join(['-'*l for l in L]) + '+'
+
+      def line(values):
+         cells = []
+         for value, l in zip(values, L):
+            spacing = ' ' * ((l - len(value)) // 2)
+            cells.append((spacing + value + spacing).ljust(l))
+         return '|' + '|'.join(cells) + '|'
+
       out_log.append(separator)
-      string = ''
-      for j, key in enumerate(keys):
-         spacing = (L[j] - L1[j]) // 2
-         str_ = ' ' * spacing + f'{key}' + ' ' * spacing
-         string = string + '|' + str_ + ' '*(L[j] - len(str_))
-      string += '|'
-      out_log.append(string)
+      out_log.append(line([str(key) for key in keys]))
       out_log.append(separator)
-      for k in range(len(log[keys[0]])):
-         string = ''
-         for j, key in enumerate(keys):
-            spacing = (L[j] - len(log[key][k]))//2
-            str_ = ' '*spacing + f'{log[key][k]}' + ' '*spacing
-            string = string + '|' + str_ + ' '*(L[j] - len(str_))
-         string += '|'
-         out_log.append(string)
+      for row in zip(*log.values()):
+         out_log.append(line(row))
          out_log.append(separator)
       out_log.append('')
       return out_log
@@ -206,9 +568,108 @@ class Parser(BaseParser):
 class ParserWithProxy(BaseParser):
    """
    This is a modification if original class but for parsing with specified proxies
+
+   Parameters
+   ----------
+   proxies_per_url : int
+         Number of proxies each url is sent to at once (the first successful response is kept).
+         1 means that proxies are tried one by one
+
+   proxy_store : ProxyStore or None
+         Scoreboard of proxies health. If specified, proxies are tried in order of their expected
+         success rate and latency and the result of each request is recorded to the store
    """
-   def __init__(self, **kwargs):
+   def __init__(self, proxies_per_url=1, proxy_store=None, **kwargs):
       super().__init__(**kwargs)
+      self.proxies_per_url = proxies_per_url
+      self.proxy_store = proxy_store
+
+   def step(self, try_id, it, url, source, config, fields, log_fields, parser_type, kwargs={}, meta=None):
+      """
+      This is a modification of original method which also records the result of the request
+      to proxy_store. Only errors raised while requesting url (e.g. connection errors and timeouts) are
+      failures of proxy, responses of the site (e.g. 403 status code, empty feed) are not
+      """
+      meta = {} if meta is None else meta
+      start = time.monotonic()
+      data, log = super().step(try_id, it, url, source, config, fields, log_fields, parser_type, kwargs, meta)
+      if self.proxy_store is not None:
+         failed = meta.get('error') is not None and meta.get('stage') == 'request'
+         self.proxy_store.record(kwargs['proxies']['https'], not failed, time.monotonic() - start)
+      return data, log
+
+   def race(self, try_id, it, proxies, urls, sources, configs, fields, log_fields, parser_types):
+      """
+      Sends url to several proxies at once and keeps the first successful response.
+      Attempts which have not started yet are cancelled, responses of the ones which are
+      still running are discarded
+
+      Parameters
+      ----------
+      try_id : int
+          try number
+
+      it : int
+          Index of url to be parsed
+
+      proxies : list of tuples
+          (proxy_id, proxy) pairs to be raced
+
+      urls, sources, configs, fields, log_fields, parser_types :
+          Same as in search method
+
+      Returns
+      -------
+      attempts : list of tuples
+          (it, proxy_id, proxy, data, log, meta) for each finished attempt in the order of completion
+          (successful attempt, if any, is the last one)
+      """
+      done = threading.Event()
+
+      def attempt(proxy_id, proxy):
+         if done.is_set():
+            return None
+         print(f'{proxy_id+1} | {try_id+1} | {it} | {sources[it]}')
+         meta = {}
+         data_, log_ = self.step(try_id, it, urls[it], sources[it], configs[it], fields, log_fields,
+                                 parser_types[it], {'proxies': proxy}, meta)
+         return it, proxy_id, proxy, data_, log_, meta
+
+      attempts = []
+      executor = ThreadPoolExecutor(max_workers=len(proxies))
+      try:
+         futures = [executor.submit(attempt, proxy_id, proxy) for proxy_id, proxy in proxies]
+         for future in as_completed(futures):
+            result = future.result()
+            if result is None:
+               continue
+            attempts.append(result)
+            if not self.is_failed(result[4]):
+               break
+      finally:
+         done.set()
+         executor.shutdown(wait=False, cancel_futures=True)
+      return attempts
+
+   def race_pass(self, try_id, ids, proxies, urls, sources, configs, fields, log_fields, parser_types,
+                 not_before=None):
+      """
+      Makes one try for each of the specified urls racing it across the specified proxies.
+      Urls of different hosts are raced in parallel if max_workers > 1, urls of the same host are raced
+      sequentially with timeout_between_requests between them (see per_host method) and are not requested
+      before the time specified in not_before
+
+      Yields
+      ------
+      attempt : tuple
+          (it, proxy_id, proxy, data, log, meta) for each finished attempt (see race method)
+      """
+      def race_one(it):
+         self.wait(it, not_before)
+         return self.race(try_id, it, proxies, urls, sources, configs, fields, log_fields, parser_types)
+
+      for attempts in self.per_host(ids, urls, race_one):
+         yield from attempts
 
    def search(self, urls, sources, configs, fields, log_fields, parser_types, number_of_tries):
       """
@@ -241,53 +702,127 @@ class ParserWithProxy(BaseParser):
       Returns
       -------
       data : dict
-          Dictionary with necessary fields retrieved from all urls
+          Dictionary with necessary fields retrieved from all urls (empty if sink is specified)
 
       log_csv : dict
           Log of parsing process of all urls (will be saved as csv)
 
       log_txt : list of strings
-          Log of parsing process of all urls (will be saved as txt)
+          Log of parsing process of all urls (will be saved as txt, empty if log_writer is specified)
 
       fine_proxies : list of strings
           List of proxies with which the parsing process has been successful
       """
       data = dict(zip(fields, [[] for _ in range(len(fields))]))
-      log = dict(zip(['proxy_id','proxy']+log_fields, [[] for _ in range(len(['proxy_id','proxy']+log_fields))]))
+      log_columns = ['proxy_id','proxy'] + log_fields + self.extra_log_fields()
+      log = dict(zip(log_columns, [[] for _ in range(len(log_columns))]))
       ids = [k for k in range(len(urls))]
       fine_proxies = {'items': []}
-
-      for proxy_id, proxy in enumerate(self.proxies):
-         kwargs = {'proxies': proxy}
+      if self.log_writer is not None:
+         self.log_writer.start(log_columns)
+
+      proxies = self.proxies
+      if self.proxy_store is not None:
+         proxies = dict([(proxy['https'], proxy) for proxy in proxies])
+         proxies = [proxies[item] for item in self.proxy_store.rank(list(proxies.keys()))]
+      proxies = list(enumerate(proxies))
+      batch_size = max(self.proxies_per_url, 1)
+      retries = {}
+
+      for start in range(0, len(proxies), batch_size):
+         batch = proxies[start:start+batch_size]
+         not_before = {}
          for try_id in range(number_of_tries):
-            new_ids = []
-            for it in ids:
-               print(f'{proxy_id+1} | {try_id+1} | {it} | {sources[it]}')
-               data_, log_ = self.step(try_id, it, urls[it], sources[it], configs[it], fields, log_fields, parser_types[it], kwargs)
+            if len(batch) == 1:
+               proxy_id, proxy = batch[0]
+               attempts = ((it, proxy_id, proxy, data_, log_, meta) for it, data_, log_, meta in
+                           self.run_pass(try_id, ids, urls, sources, configs, fields, log_fields,
+                                         parser_types, {'proxies': proxy}, prefix=f'{proxy_id+1} | ',
+                                         not_before=not_before))
+            else:
+               attempts = self.race_pass(try_id, ids, batch, urls, sources, configs, fields, log_fields,
+                                         parser_types, not_before=not_before)
+
+            parsed_ids = set()
+            outcomes = {}
+            retry_at = {}
+            for it, proxy_id, proxy, data_, log_, meta in attempts:
+               data_, log_ = self.keep_new(data_, log_)
                log_['proxy'] = [str(proxy['https'])]
                log_['proxy_id'] = [str(proxy_id+1)]
-               if log_['title'] in [[''], ['0']]:
-                  new_ids.append(it)
-               else:
+               outcome, delay = self.decide(try_id, log_, meta,
+                                            last=try_id+1 == number_of_tries and start+batch_size >= len(proxies))
+               outcomes.setdefault(it, []).append(outcome)
+               if outcome == 'ok':
+                  parsed_ids.add(it)
                   if proxy['https'] not in fine_proxies['items']:
                      fine_proxies['items'].append(proxy['https'])
-                  data = append_dict(data, data_)
+                  data = self.store(urls[it], data, data_, meta)
+               elif outcome == 'retry':
+                  retry_at[it] = min(retry_at.get(it, float('inf')), time.monotonic() + delay)
+               self.report(urls[it], sources[it], proxy['https'], retries.get(it, 0), outcome, log_, meta)
+               retries[it] = retries.get(it, 0) + 1
                log = append_dict(log, log_)
-               time.sleep(self.timeout_between_requests)
-            if len(new_ids) == 0:
+               if self.log_writer is not None:
+                  self.log_writer.write(log_)
+            not_before.update(retry_at)
+            given_up = [it for it, items in outcomes.items() if all([item == 'give up' for item in items])]
+            ids = [it for it in ids if it not in parsed_ids and it not in given_up]
+            if len(ids) == 0:
                break
-            ids = new_ids
-         if len(new_ids) == 0:
+         if len(ids) == 0:
             break
 
-      log_txt = self.reform_log(log)
-      log['TIME'] = [datetime.datetime.now() for _ in range(len(log[list(log.keys())[0]]))]
-      log_csv = log
+      log_csv, log_txt = self.finish(log)
       return data, log_csv, log_txt, fine_proxies
 
 ###################################################################################################################
 
 class SubSteps:
+   # custom parsers defined in configs (see extractors.py)
+   extractors = {}
+
+   # items of TheBell news feed and classes of their fields
+   thebell_items = SoupStrainer('div', class_=['line-widget ng-star-inserted'])
+   thebell_fields = {'title': re.compile(r"text text-33"),
+                     'type': re.compile(r"category category-33"),
+                     'date': re.compile(r"time time-33")}
+
+   # parsers which accept seen argument (callable returning whether item is already stored)
+   # and stop after seen_streak already stored items in a row
+   incremental = ['rss_fast']
+   seen_streak = 3
+
+   # items of rss (2.0 and 1.0) and atom feeds and names of elements for feedparser keys used in parser_config
+   rss_items = ['item', '{http://purl.org/rss/1.0/}item', '{http://www.w3.org/2005/Atom}entry']
+   rss_tags = {'summary': ['description', 'summary'],
+               'description': ['description', 'summary'],
+               'published_parsed': ['pubDate', 'published', 'date', 'issued'],
+               'updated_parsed': ['updated', 'modified'],
+               'term': ['category'],
+               'id': ['guid', 'id']}
+
+   @classmethod
+   def register(cls, extractors):
+      """
+      Registers custom parsers, so that they can be used as parser types
+
+      Parameters
+      ----------
+      extractors : dict
+          Dictionary in format d[parser_type] = callable with the same signature as methods of this class
+      """
+      cls.extractors.update(extractors)
+
+   @classmethod
+   def get(cls, parser_type):
+      """
+      Returns parser of the specified type (registered custom parsers are looked up first)
+      """
+      if parser_type in cls.extractors:
+         return cls.extractors[parser_type]
+      return getattr(cls, parser_type)
+
    @staticmethod
    def rss(response, data, source, config):
       """
@@ -315,26 +850,94 @@ class SubSteps:
       return data, status_code
 
    @staticmethod
-   def thebell(response, data, source, config=None):
+   def rss_value(key, element):
       """
-      Parser for TheBell
+      Returns value of element of rss item for feedparser key (see rss_fast), None if it is empty
+      """
+      text = ''.join(element.itertext()).strip()
+      if key in ['link', 'term']:
+         return text or element.get('href' if key == 'link' else 'term')
+      if key in ['published_parsed', 'updated_parsed']:
+         try:
+            date = parsedate_to_datetime(text)
+         except (TypeError, ValueError):
+            try:
+               date = datetime.datetime.fromisoformat(text)
+            except ValueError:
+               return None
+         if date.tzinfo is not None:
+            date = date.astimezone(datetime.timezone.utc)
+         return f'{date.year}-{date.month}-{date.day}'
+      return text or None
+
+   @staticmethod
+   def rss_fast(response, data, source, config, seen=None):
+      """
+      Fast parser of rss and atom feeds which reads raw bytes of the response incrementally and takes only
+      the fields specified in config (tags are named as in feedparser, see rss_tags). Values are not sanitized
+      by feedparser, items without date get None instead of failing the whole feed.
+      If seen is specified, parsing stops after seen_streak already stored items in a row (they are kept
+      in data and are dropped later by seen_index)
       """
-      bs = BeautifulSoup(response.text, "lxml")
       status_code = str(response.status_code)
+      keys = {'title': config['title_tag'], 'summary': config['summary_tag'], 'date': config['date_tag'],
+              'link': config['link_tag'], 'type': config['type_tag']}
+      names = dict([(field, SubSteps.rss_tags.get(key, [key])) for field, key in keys.items()])
+
+      streak = 0
+      for _, item in etree.iterparse(io.BytesIO(response.content), events=('end',), tag=SubSteps.rss_items,
+                                     recover=True, resolve_entities=False):
+         values = dict.fromkeys(keys)
+         for child in item:
+            if not isinstance(child.tag, str):
+               continue
+            name = etree.QName(child).localname
+            for field, key in keys.items():
+               if values[field] is None and name in names[field]:
+                  if field == 'link' and child.get('rel', 'alternate') != 'alternate':
+                     continue
+                  values[field] = SubSteps.rss_value(key, child)
+
+         for field, value in values.items():
+            data[field].append(value)
+         item.clear()
+         while item.getprevious() is not None:
+            del item.getparent()[0]
+
+         if seen is not None:
+            streak = streak + 1 if seen(source, values['title'], values['date'], values['link']) else 0
+            if streak >= SubSteps.seen_streak:
+               break
 
-      texts = [str(k) for k in bs.find_all('div', class_=['line-widget ng-star-inserted'])]
-      data['title'] = [BeautifulSoup(text).find('div', attrs={'class': re.compile(r"text text-33")}) for text in texts]
-      data['summary'] = [None for text in texts]
-      data['type'] = [BeautifulSoup(text).find('div', attrs={'class': re.compile(r"category category-33")}) for text in texts]
-      data['date'] = [BeautifulSoup(text).find('div', attrs={'class': re.compile(r"time time-33")}) for text in texts]
-      none_ids = [k for k in data['source'] if k is None]
+      data['source'] = [source for _ in range(len(data['title']))]
+      data['date_parsed'] = [datetime.datetime.now() for _ in range(len(data['title']))]
+
+      return data, status_code
+
+   @staticmethod
+   def thebell(response, data, source, config=None):
+      """
+      Parser for TheBell. Only news items are parsed from the page and fields of each item are found
+      in a single pass over its elements
+      """
+      bs = BeautifulSoup(response.text, "lxml", parse_only=SubSteps.thebell_items)
+      status_code = str(response.status_code)
 
       for key in ['title', 'summary', 'type', 'date']:
-         data[key] = [item.text if item is not None else None for item in data[key]]
-         data[key] = [item for k, item in enumerate(data[key]) if k not in none_ids]
+         data[key] = []
+      for item in bs.find_all('div', class_=['line-widget ng-star-inserted']):
+         found = dict.fromkeys(SubSteps.thebell_fields)
+         for div in item.find_all('div'):
+            classes = ' '.join(div.get('class', []))
+            for key, pattern in SubSteps.thebell_fields.items():
+               if found[key] is None and pattern.search(classes):
+                  found[key] = div.text
+         for key, value in found.items():
+            data[key].append(value)
+         data['summary'].append(None)
 
       data['link'] = [None for _ in range(len(data['title']))]
       data['source'] = [source for _ in range(len(data['title']))]
       data['date_parsed'] = [datetime.datetime.now() for _ in range(len(data['title']))]
 
-      return data, status_code
\ No newline at end of file
+      return data, status_code
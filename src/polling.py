@@ -0,0 +1,126 @@
+import csv
+import datetime
+import json
+import os
+
+
+def count_new(status_code, new):
+    """
+    Returns the number of new items found by a try from its log (STATUS_CODE and NEW columns).
+    Tries of unchanged pages (304 or UNCHANGED status code) have no new items even if NEW is empty
+    (e.g. seen_index is disabled), None is returned if the number is not known
+    """
+    if new not in ['', None]:
+        return int(new)
+    if str(status_code) in ['304', 'UNCHANGED']:
+        return 0
+    return None
+
+
+class AdaptivePoller:
+    """
+    Learns the rate of new items of each source and chooses the interval between its calls, so that busy
+    sources are parsed more often and quiet ones less often. The rate (new items per hour) is smoothed
+    with exponential moving average
+
+    Parameters
+    ----------
+    min_interval : int or float
+        Minimum interval (in seconds) between calls of a source
+
+    max_interval : int or float
+        Maximum interval (in seconds) between calls of a source
+
+    target_new_items : int or float
+        Desired number of new items per call
+
+    smoothing : float
+        Weight of the latest observation in the moving average (from 0 to 1)
+    """
+    def __init__(self, min_interval, max_interval, target_new_items, smoothing=0.3):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.target_new_items = target_new_items
+        self.smoothing = smoothing
+        self.rates = {}
+        self.last_calls = {}
+
+    def observe(self, source, n_new, time):
+        """
+        Records the number of new items of source found by the call made at time
+
+        Parameters
+        ----------
+        source : string
+            Source name
+
+        n_new : int
+            Number of new items
+
+        time : datetime.datetime
+            Time of the call
+        """
+        if source in self.last_calls and time > self.last_calls[source]:
+            hours = (time - self.last_calls[source]).total_seconds() / 3600
+            rate = n_new / hours
+            if source in self.rates:
+                rate = self.smoothing * rate + (1 - self.smoothing) * self.rates[source]
+            self.rates[source] = rate
+        self.last_calls[source] = time
+
+    def interval(self, source):
+        """
+        Returns the interval (in seconds) till the next call of source (None if its rate is not known yet)
+        """
+        if source not in self.rates:
+            return None
+        if self.rates[source] <= 0:
+            return self.max_interval
+        interval = self.target_new_items / self.rates[source] * 3600
+        return min(max(interval, self.min_interval), self.max_interval)
+
+    def load_history(self, path, filename):
+        """
+        Learns rates from log of past runs: json lines written by LogWriter (filename.jsonl) or csv log
+        (filename.csv) if there are no json lines. Rows with TIME column and with the number of new items
+        (see count_new) are used in order of time (rows of workers of sharded collection are appended
+        to the log one worker after another)
+
+        Parameters
+        ----------
+        path : string
+            Path to the folder with the log
+
+        filename : string
+            Name of the log file (without extension)
+
+        Returns
+        -------
+        n_rows : int
+            Number of rows used
+        """
+        rows = []
+        if os.path.isfile(f'{path}/{filename}.jsonl') and os.path.getsize(f'{path}/{filename}.jsonl') > 0:
+            with open(f'{path}/{filename}.jsonl', 'r', encoding='utf8') as f:
+                for line in f:
+                    try:
+                        rows.append(json.loads(line))
+                    except ValueError:
+                        continue
+        elif os.path.isfile(f'{path}/{filename}.csv'):
+            with open(f'{path}/{filename}.csv', 'r', encoding='utf8', newline='') as f:
+                rows = list(csv.DictReader(f))
+
+        observations = []
+        for row in rows:
+            if not row.get('source') or not row.get('TIME'):
+                continue
+            try:
+                n_new = count_new(row.get('STATUS_CODE'), row.get('NEW'))
+                if n_new is not None:
+                    observations.append((datetime.datetime.fromisoformat(str(row['TIME'])), row['source'], n_new))
+            except ValueError:
+                continue
+        for time, source, n_new in sorted(observations):
+            self.observe(source, n_new, time)
+        return len(observations)
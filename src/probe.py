@@ -0,0 +1,143 @@
+import socket
+import ssl
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+
+def read_head(sock, limit=8192):
+    """
+    Reads the head of http response (status line and headers) from socket
+
+    Returns
+    -------
+    head : bytes
+    """
+    head = b''
+    while b'\r\n\r\n' not in head and len(head) < limit:
+        chunk = sock.recv(1024)
+        if not chunk:
+            break
+        head += chunk
+    return head
+
+
+def status_of(head):
+    """
+    Returns status code from the head of http response ('' if it can not be found)
+    """
+    parts = head.split(b'\r\n', 1)[0].split()
+    return parts[1].decode('ascii', 'replace') if len(parts) > 1 else ''
+
+
+def probe_proxy(proxy, test_url, timeout=3, verify=True):
+    """
+    Checks whether proxy is alive. For https test_url a tunnel is opened with CONNECT and TLS handshake
+    is made with the test host through it, for http test_url a GET request is sent through proxy
+    (only the head of the response is read).
+    Each network operation (connect, handshake, reading a response) is limited by timeout
+
+    Parameters
+    ----------
+    proxy : string
+        Proxy in format scheme://host:port (http and https schemes are supported)
+
+    test_url : string
+        Url of the test endpoint
+
+    timeout : int or float
+        Time (in seconds) to wait for each network operation
+
+    verify : bool
+        Whether TLS certificates should be verified
+
+    Returns
+    -------
+    alive : bool
+        Whether proxy has passed the check
+
+    latency : float or None
+        Time (in seconds) taken by the check
+
+    error : string
+        Reason of failure ('' if proxy is alive)
+    """
+    proxy_url = urlparse(proxy)
+    target = urlparse(test_url)
+    target_port = target.port or (443 if target.scheme == 'https' else 80)
+    context = ssl.create_default_context()
+    if not verify:
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+
+    start = time.monotonic()
+    sock = None
+    try:
+        sock = socket.create_connection((proxy_url.hostname, proxy_url.port), timeout=timeout)
+        sock.settimeout(timeout)
+        if proxy_url.scheme == 'https':
+            sock = context.wrap_socket(sock, server_hostname=proxy_url.hostname)
+
+        if target.scheme == 'https':
+            address = f'{target.hostname}:{target_port}'
+            sock.sendall(f'CONNECT {address} HTTP/1.1\r\nHost: {address}\r\n\r\n'.encode())
+            status = status_of(read_head(sock))
+            if status != '200':
+                return False, None, f'CONNECT status: {status or "no response"}'
+            sock = context.wrap_socket(sock, server_hostname=target.hostname)
+        else:
+            sock.sendall(f'GET {test_url} HTTP/1.1\r\nHost: {target.netloc}\r\nConnection: close\r\n\r\n'.encode())
+            status = status_of(read_head(sock))
+            if status[:1] not in ['2', '3']:
+                return False, None, f'status: {status or "no response"}'
+
+        return True, time.monotonic() - start, ''
+
+    except Exception as e:
+        return False, None, str(e)
+
+    finally:
+        if sock is not None:
+            sock.close()
+
+
+def probe_proxies(proxies, test_url, timeout=3, max_workers=64, verify=True, proxy_store=None):
+    """
+    Checks proxies concurrently and returns the alive ones. Results of the checks (with latencies
+    of alive proxies) are recorded to proxy_store, so that proxies which keep failing are evicted.
+    Nothing is recorded if all proxies have failed, since it is rather an outage of the test endpoint
+
+    Parameters
+    ----------
+    proxies : array-like of strings
+        Proxies to be checked
+
+    test_url : string
+        Url of the test endpoint
+
+    timeout : int or float
+        Time (in seconds) to wait for each network operation
+
+    max_workers : int
+        Number of proxies to be checked in parallel
+
+    verify : bool
+        Whether TLS certificates should be verified
+
+    proxy_store : ProxyStore or None
+        Store of proxy statistics to record results of the checks to
+
+    Returns
+    -------
+    alive : list of strings
+        Proxies which have passed the check (in the same order as in the input)
+    """
+    proxies = list(proxies)
+    if len(proxies) == 0:
+        return []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(proxies))) as executor:
+        results = list(executor.map(lambda proxy: probe_proxy(proxy, test_url, timeout, verify), proxies))
+    if proxy_store is not None and any([alive for alive, _, _ in results]):
+        for proxy, (alive, latency, _) in zip(proxies, results):
+            proxy_store.record(proxy, alive, latency)
+    return [proxy for proxy, (alive, _, _) in zip(proxies, results) if alive]
@@ -0,0 +1,224 @@
+import datetime
+import os
+import statistics
+import threading
+import yaml
+from F import atomic_write
+
+
+class NoAliasDumper(yaml.SafeDumper):
+    """
+    Yaml dumper which writes repeated objects (e.g. equal timestamps) as they are instead of aliases
+    """
+    def ignore_aliases(self, data):
+        return True
+
+
+class ProxyStore:
+    """
+    Persistent scoreboard of proxies health.
+    For each proxy it keeps decayed numbers of successes and failures, latest latencies and the time
+    when the proxy has been seen working for the last time. Proxies which keep failing are evicted
+    and are not accepted again until ban_time passes, proxies which have not been seen working
+    for forget_after (e.g. never checked ones) are forgotten
+
+    Parameters
+    ----------
+    path : string
+        Path to the folder with the store file
+
+    filename : string
+        Name of the store file (without extension)
+
+    half_life : int or float
+        Time (in hours) after which the weight of an observation is halved
+
+    max_failures : int
+        Number of consecutive failures after which a proxy is evicted
+
+    ban_time : int or float
+        Time (in hours) during which an evicted proxy is not accepted again
+
+    forget_after : int or float
+        Time (in hours) after which a proxy which has not been seen working since then (or since it has been
+        added) is removed from the store
+
+    latency_window : int
+        Number of latest latencies used to compute median latency
+
+    default_latency : int or float
+        Latency (in seconds) assumed for proxies without successful requests
+    """
+    def __init__(self, path, filename, half_life=24, max_failures=5, ban_time=72, forget_after=72,
+                 latency_window=20, default_latency=10):
+        self.file = f'{path}/{filename}.yaml'
+        self.half_life = half_life
+        self.max_failures = max_failures
+        self.ban_time = ban_time
+        self.forget_after = forget_after
+        self.latency_window = latency_window
+        self.default_latency = default_latency
+        self.lock = threading.Lock()
+        self.stats = {}
+        self.evicted = {}
+        if os.path.isfile(self.file):
+            with open(self.file, 'r') as f:
+                file = yaml.safe_load(f) or {}
+            self.stats = file.get('stats', {})
+            self.evicted = file.get('evicted', {})
+
+    def add(self, proxies):
+        """
+        Adds new proxies to the store (known and recently evicted proxies are skipped)
+
+        Parameters
+        ----------
+        proxies : array-like of strings
+            Proxies to be added
+        """
+        now = datetime.datetime.now()
+        with self.lock:
+            for proxy in proxies:
+                if proxy in self.evicted:
+                    if now - self.evicted[proxy] < datetime.timedelta(hours=self.ban_time):
+                        continue
+                    del self.evicted[proxy]
+                if proxy not in self.stats:
+                    self.stats[proxy] = {'successes': 0.0, 'failures': 0.0, 'consecutive_failures': 0,
+                                         'latencies': [], 'last_seen': None, 'added': now, 'updated': now}
+
+    def expire(self, now):
+        """
+        Forgets evicted proxies whose ban_time has passed and proxies which have not been seen working
+        for forget_after (the store must be locked)
+        """
+        ban_time = datetime.timedelta(hours=self.ban_time)
+        for proxy in [proxy for proxy, evicted in self.evicted.items() if now - evicted >= ban_time]:
+            del self.evicted[proxy]
+        forget_after = datetime.timedelta(hours=self.forget_after)
+        for proxy in [proxy for proxy, item in self.stats.items()
+                      if now - (item['last_seen'] or item.get('added', item['updated'])) >= forget_after]:
+            del self.stats[proxy]
+
+    def decay(self, proxy, now):
+        """
+        Decays numbers of successes and failures of proxy according to the time passed since the last update
+        """
+        item = self.stats[proxy]
+        hours = (now - item['updated']).total_seconds() / 3600
+        factor = 0.5 ** (hours / self.half_life)
+        item['successes'] *= factor
+        item['failures'] *= factor
+        item['updated'] = now
+
+    def record(self, proxy, success, latency=None):
+        """
+        Records the result of a request made through proxy
+
+        Parameters
+        ----------
+        proxy : string
+            Proxy used
+
+        success : bool
+            Whether the request has been successful
+
+        latency : int or float
+            Time (in seconds) taken by the request (used only for successful requests)
+        """
+        now = datetime.datetime.now()
+        with self.lock:
+            if proxy in self.evicted:
+                return
+            if proxy not in self.stats:
+                self.stats[proxy] = {'successes': 0.0, 'failures': 0.0, 'consecutive_failures': 0,
+                                     'latencies': [], 'last_seen': None, 'added': now, 'updated': now}
+            self.decay(proxy, now)
+            item = self.stats[proxy]
+            if success:
+                item['successes'] += 1
+                item['consecutive_failures'] = 0
+                item['last_seen'] = now
+                if latency is not None:
+                    item['latencies'] = (item['latencies'] + [round(latency, 3)])[-self.latency_window:]
+            else:
+                item['failures'] += 1
+                item['consecutive_failures'] += 1
+                if item['consecutive_failures'] >= self.max_failures:
+                    del self.stats[proxy]
+                    self.evicted[proxy] = now
+
+    def success_rate(self, proxy):
+        """
+        Returns expected success rate of proxy (smoothed, so that new proxies get 0.5)
+        """
+        item = self.stats[proxy]
+        return (item['successes'] + 1) / (item['successes'] + item['failures'] + 2)
+
+    def median_latency(self, proxy):
+        """
+        Returns median latency of proxy (default_latency if there are no successful requests yet)
+        """
+        latencies = self.stats[proxy]['latencies']
+        return statistics.median(latencies) if latencies else self.default_latency
+
+    def score(self, proxy):
+        """
+        Returns expected number of successful requests per second made through proxy
+        """
+        return self.success_rate(proxy) / max(self.median_latency(proxy), 1e-3)
+
+    def rank(self, proxies=None):
+        """
+        Returns proxies sorted by their score (the best ones go first), unknown proxies are placed
+        as the new ones and evicted proxies are dropped
+
+        Parameters
+        ----------
+        proxies : array-like of strings
+            Proxies to be sorted (all proxies from the store if None)
+
+        Returns
+        -------
+        proxies : list of strings
+        """
+        now = datetime.datetime.now()
+        with self.lock:
+            self.expire(now)
+            if proxies is None:
+                proxies = list(self.stats.keys())
+            proxies = [proxy for proxy in proxies if proxy not in self.evicted]
+            for proxy in proxies:
+                if proxy in self.stats:
+                    self.decay(proxy, now)
+            new_score = 0.5 / self.default_latency
+            return sorted(proxies, key=lambda proxy: self.score(proxy) if proxy in self.stats else new_score,
+                          reverse=True)
+
+    def merge(self, other):
+        """
+        Merges another store (e.g. of a worker of sharded collection): the most recently updated stats
+        of each proxy are kept, proxies evicted by any of the stores are evicted
+
+        Parameters
+        ----------
+        other : ProxyStore
+            Store to be merged
+        """
+        with self.lock:
+            for proxy, item in other.stats.items():
+                if proxy not in self.stats or item['updated'] > self.stats[proxy]['updated']:
+                    self.stats[proxy] = item
+            for proxy, evicted in other.evicted.items():
+                self.evicted[proxy] = max(evicted, self.evicted.get(proxy, evicted))
+                self.stats.pop(proxy, None)
+
+    def save(self):
+        """
+        Saves the store to its file (evicted proxies whose ban_time has passed and forgotten proxies are not saved)
+        """
+        with self.lock:
+            self.expire(datetime.datetime.now())
+            with atomic_write(self.file) as w:
+                yaml.dump({'stats': self.stats, 'evicted': self.evicted}, w, Dumper=NoAliasDumper,
+                          default_flow_style=False)
@@ -0,0 +1,144 @@
+import datetime
+import random
+from email.utils import parsedate_to_datetime
+
+
+class RetryPolicy:
+    """
+    Decides whether a failed try should be repeated and how long to wait before the next try.
+    Tries are classified as:
+        - ok - something has been parsed or the page has not changed
+        - retry - transient failure (retryable status code, timeout, connection error, empty page)
+        - give up - permanent failure (other 4xx/5xx status codes, unknown host, error of parser)
+    Delays grow exponentially with the number of the try, are randomized with jitter and respect
+    Retry-After header
+
+    Parameters
+    ----------
+    base_delay : int or float
+        Delay (in seconds) before the second try
+
+    max_delay : int or float
+        Maximum delay (in seconds), urls which ask (by Retry-After header) to wait longer are given up
+
+    jitter : float
+        Fraction of the delay which is randomized (from 0 to 1)
+
+    retry_statuses : array-like of ints
+        Status codes which are considered as transient failures
+    """
+    def __init__(self, base_delay=2, max_delay=120, jitter=0.5, retry_statuses=(408, 425, 429, 500, 502, 503, 504)):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.retry_statuses = [int(status) for status in retry_statuses]
+
+    @staticmethod
+    def retry_after(value):
+        """
+        Returns delay (in seconds) from value of Retry-After header (None if it is missing or invalid)
+        """
+        if not value:
+            return None
+        try:
+            return max(float(value), 0)
+        except ValueError:
+            pass
+        try:
+            date = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        return max((date - datetime.datetime.now(date.tzinfo)).total_seconds(), 0)
+
+    @staticmethod
+    def is_transient(error):
+        """
+        Returns whether exception raised while requesting url is transient (timeouts and connection errors
+        except unknown host)
+        """
+        names = [cls.__name__ for cls in type(error).__mro__]
+        text = str(error)
+        if any([marker in text for marker in ['NameResolutionError', 'Name or service not known',
+                                                'nodename nor servname', 'getaddrinfo failed']]):
+            return False
+        return any([('Timeout' in name) or (name in ['ConnectionError', 'ConnectError', 'ProxyError',
+                                                     'RemoteProtocolError', 'ReadError', 'ChunkedEncodingError'])
+                    for name in names])
+
+    def classify(self, failed, meta):
+        """
+        Classifies try
+
+        Parameters
+        ----------
+        failed : bool
+            Whether nothing has been parsed and the page has not been reported as unchanged
+
+        meta : dict
+            Details of the try filled by step method (status_code, retry_after, error, stage)
+
+        Returns
+        -------
+        outcome : string
+            'ok', 'retry' or 'give up'
+        """
+        status = meta.get('status_code')
+        if not failed:
+            return 'ok'
+        if 'error' in meta:
+            if meta.get('stage') == 'parse':
+                return 'give up'
+            return 'retry' if self.is_transient(meta['error']) else 'give up'
+        if status is not None and status >= 400:
+            return 'retry' if status in self.retry_statuses else 'give up'
+        return 'retry'
+
+    def delay(self, try_id, retry_after=None):
+        """
+        Returns delay (in seconds) before the try following try number try_id (counted from 0)
+        """
+        delay = min(self.base_delay * 2 ** try_id, self.max_delay)
+        delay = delay * (1 - self.jitter * random.random())
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    def decide(self, try_id, failed, log, meta):
+        """
+        Returns decision for try and logs it to DECISION column
+
+        Parameters
+        ----------
+        try_id : int
+            try number (counted from 0)
+
+        failed : bool
+            Whether nothing has been parsed and the page has not been reported as unchanged
+
+        log : dict
+            Log of parsing process for url
+
+        meta : dict
+            Details of the try filled by step method
+
+        Returns
+        -------
+        outcome : string
+            'ok', 'retry' or 'give up'
+
+        delay : float
+            Delay (in seconds) before the next try (0 if it should not be repeated)
+        """
+        outcome = self.classify(failed, meta)
+        delay = 0
+        if outcome == 'retry':
+            retry_after = self.retry_after(meta.get('retry_after'))
+            if retry_after is not None and retry_after > self.max_delay:
+                outcome = 'give up'
+                log['DECISION'] = [f'give up (retry after {retry_after:.0f}s)']
+                return outcome, delay
+            delay = self.delay(try_id, retry_after)
+            log['DECISION'] = [f'retry in {delay:.1f}s']
+        else:
+            log['DECISION'] = [outcome]
+        return outcome, delay
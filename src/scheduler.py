@@ -30,8 +30,15 @@ for job in my_cron:
 ###########################################################################################
 ###                                Defining new job                                     ###
 
-job = my_cron.new(command=f'python3 {SRC_PATH}/collector.py >> {LOG_PATH}/output.txt')
-job.setall(configs['schedule'])
+if configs['daemon']['enabled']:
+    job = my_cron.new(command=f'python3 {SRC_PATH}/daemon.py >> {LOG_PATH}/output.txt')
+    job.every_reboot()
+elif configs['sharding']['enabled']:
+    job = my_cron.new(command=f'python3 {SRC_PATH}/sharding.py >> {LOG_PATH}/output.txt')
+    job.setall(configs['schedule'])
+else:
+    job = my_cron.new(command=f'python3 {SRC_PATH}/collector.py >> {LOG_PATH}/output.txt')
+    job.setall(configs['schedule'])
 my_cron.write()
 
 for job in my_cron:
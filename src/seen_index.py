@@ -0,0 +1,172 @@
+import hashlib
+import os
+import threading
+from array import array
+from F import atomic_write
+
+
+class SeenIndex:
+    """
+    Persistent index of already stored items, which is used to save only new items of feeds.
+    Each item is kept as 8-byte hash of (source, link) or of (source, title, date) if item has no link.
+    Only max_items of the latest keys are kept, so both the memory used and the file size are bounded.
+    Keys are kept in a ring buffer in order of addition and in a hash table with open addressing
+    (both are arrays of 8-byte ints, about 24 bytes per key), so that the index of 500000 keys takes 12 MB
+
+    Parameters
+    ----------
+    path : string
+        Path to the folder with the index file
+
+    filename : string
+        Name of the index file (without extension)
+
+    max_items : int
+        Maximum number of keys to be kept (the oldest keys are dropped first)
+    """
+    def __init__(self, path, filename, max_items=500000):
+        self.file = f'{path}/{filename}.bin'
+        self.max_items = max_items
+        self.lock = threading.Lock()
+        # ring buffer of keys from the oldest to the newest starting at head
+        self.ring = array('Q', bytes(8 * max_items))
+        self.head = 0
+        self.size = 0
+        # hash table of keys with linear probing (0 marks empty slot), it is at most half full
+        capacity = 1
+        while capacity < 2 * max_items:
+            capacity *= 2
+        self.mask = capacity - 1
+        self.table = array('Q', bytes(8 * capacity))
+        if os.path.isfile(self.file):
+            keys = array('Q')
+            with open(self.file, 'rb') as f:
+                keys.frombytes(f.read())
+            for key in keys[-max_items:] if max_items > 0 else []:
+                self.add(key or 1)
+
+    @staticmethod
+    def key(source, title, date, link):
+        """
+        Returns 8-byte hash of item as int (never 0, which marks empty slots of the hash table)
+        """
+        parts = [source, link] if link is not None else [source, title, date]
+        digest = hashlib.blake2b('\x1f'.join([str(part) for part in parts]).encode('utf8'), digest_size=8)
+        return int.from_bytes(digest.digest(), 'little') or 1
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        """
+        Iterates over keys from the oldest to the newest (the index must not be changed meanwhile)
+        """
+        for it in range(self.size):
+            yield self.ring[(self.head + it) % self.max_items]
+
+    def find(self, key):
+        """
+        Returns slot of key in the hash table or the empty slot where it should be placed
+        """
+        slot = key & self.mask
+        while self.table[slot] != 0 and self.table[slot] != key:
+            slot = (slot + 1) & self.mask
+        return slot
+
+    def remove(self, key):
+        """
+        Removes key from the hash table, keys placed after it are shifted back,
+        so that none of them is separated from its home slot by an empty slot
+        """
+        slot = self.find(key)
+        if self.table[slot] == 0:
+            return
+        it = slot
+        while True:
+            it = (it + 1) & self.mask
+            other = self.table[it]
+            if other == 0:
+                break
+            if (it - (other & self.mask)) & self.mask >= (it - slot) & self.mask:
+                self.table[slot] = other
+                slot = it
+        self.table[slot] = 0
+
+    def add(self, key):
+        """
+        Adds key to the index if it is not there (the oldest key is dropped if the index is full)
+        and returns whether it has been added. Must be called with the index locked
+        """
+        slot = self.find(key)
+        if self.table[slot] != 0 or self.max_items == 0:
+            return False
+        if self.size == self.max_items:
+            self.remove(self.ring[self.head])
+            self.ring[self.head] = key
+            self.head = (self.head + 1) % self.max_items
+            slot = self.find(key)
+        else:
+            self.ring[(self.head + self.size) % self.max_items] = key
+            self.size += 1
+        self.table[slot] = key
+        return True
+
+    def seen(self, source, title, date, link):
+        """
+        Returns whether item is already in the index
+        """
+        key = self.key(source, title, date, link)
+        with self.lock:
+            return self.table[self.find(key)] != 0
+
+    def filter(self, data):
+        """
+        Drops already seen items from data and adds the new ones to the index
+
+        Parameters
+        ----------
+        data : dict
+            Dictionary with fields retrieved from url (must contain source, title, date and link fields)
+
+        Returns
+        -------
+        data : dict
+            Dictionary with new items only
+
+        n_new : int
+            Number of new items
+        """
+        rows = zip(data['source'], data['title'], data['date'], data['link'])
+        new_ids = []
+        with self.lock:
+            for it, (source, title, date, link) in enumerate(rows):
+                if self.add(self.key(source, title, date, link)):
+                    new_ids.append(it)
+
+        if len(new_ids) < len(data['title']):
+            data = dict([(field, [values[it] for it in new_ids]) for field, values in data.items()])
+        return data, len(new_ids)
+
+    def merge(self, other):
+        """
+        Adds keys of another index (e.g. of a worker of sharded collection) which are not in the index yet
+
+        Parameters
+        ----------
+        other : SeenIndex
+            Index to be merged
+        """
+        with self.lock, other.lock:
+            for key in other:
+                self.add(key)
+
+    def save(self):
+        """
+        Saves the index to its file (keys from the oldest to the newest)
+        """
+        with self.lock:
+            end = self.head + self.size
+            with atomic_write(self.file, 'wb') as w:
+                self.ring[self.head:min(end, self.max_items)].tofile(w)
+                if end > self.max_items:
+                    self.ring[:end - self.max_items].tofile(w)
@@ -0,0 +1,117 @@
+import threading
+from collections import OrderedDict
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+
+class SessionPool:
+    """
+    Pool of http sessions with keep-alive connections, one session per pair of host and proxy, so that
+    retries and repeated requests to the same host (directly or through the same proxy) reuse connections
+    instead of making new TCP and TLS handshakes
+
+    Parameters
+    ----------
+    backend : string
+        'requests' (HTTP/1.1) or 'httpx' (HTTP/2, httpx library with http2 extra is required)
+
+    pool_connections : int
+        Number of connection pools kept by each session
+
+    pool_maxsize : int
+        Maximum number of connections kept in each pool
+
+    max_sessions : int
+        Maximum number of sessions (the least recently used ones are closed first)
+    """
+    def __init__(self, backend='requests', pool_connections=10, pool_maxsize=10, max_sessions=256):
+        if backend not in ['requests', 'httpx']:
+            raise ValueError(f'Unknown session backend: {backend}')
+        if backend == 'httpx' and httpx is None:
+            raise ImportError('httpx library is required for httpx session backend')
+        self.backend = backend
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.max_sessions = max_sessions
+        self.lock = threading.Lock()
+        self.sessions = OrderedDict()
+
+    def create(self, proxy):
+        """
+        Returns a new session (proxy is used only by httpx backend, which binds proxy to a client)
+        """
+        if self.backend == 'httpx':
+            limits = httpx.Limits(max_connections=self.pool_maxsize, max_keepalive_connections=self.pool_maxsize)
+            return httpx.Client(http2=True, proxy=proxy, limits=limits, follow_redirects=True)
+
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.pool_connections, pool_maxsize=self.pool_maxsize)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def session(self, url, proxy=None):
+        """
+        Returns session for host of url and proxy (a new one is created if there is no such session)
+        """
+        parsed = urlparse(url)
+        key = (parsed.scheme, parsed.netloc, proxy)
+        with self.lock:
+            if key in self.sessions:
+                self.sessions.move_to_end(key)
+                return self.sessions[key]
+            session = self.create(proxy)
+            self.sessions[key] = session
+            while len(self.sessions) > self.max_sessions:
+                _, old_session = self.sessions.popitem(last=False)
+                old_session.close()
+            return session
+
+    def get(self, url, timeout, headers=None, proxies=None, stream=False):
+        """
+        Makes GET request to url with session of its host and proxy
+
+        Parameters
+        ----------
+        url : string
+            Url to be requested
+
+        timeout : int or float
+            Waiting time for response (in seconds)
+
+        headers : dict or None
+            Headers of the request
+
+        proxies : dict or None
+            Proxies in format of requests library (d['http'], d['https'])
+
+        stream : bool
+            Whether only headers should be received (the body is then read by response.content for requests
+            backend or by response.read() for httpx backend)
+
+        Returns
+        -------
+        response : requests.Response or httpx.Response
+        """
+        proxy = None
+        if proxies is not None:
+            proxy = proxies.get(urlparse(url).scheme)
+        if self.backend == 'httpx':
+            client = self.session(url, proxy)
+            return client.send(client.build_request('GET', url, headers=headers, timeout=timeout), stream=stream)
+        return self.session(url, proxy).get(url, headers=headers, timeout=timeout, proxies=proxies, stream=stream)
+
+    def close(self):
+        """
+        Closes all sessions
+        """
+        with self.lock:
+            for session in self.sessions.values():
+                session.close()
+            self.sessions.clear()
@@ -0,0 +1,404 @@
+import argparse
+import csv
+import datetime
+import glob
+import json
+import multiprocessing
+import os
+import shutil
+import socket
+import sqlite3
+import time
+import traceback
+from contextlib import closing
+from collector import Collector, configs, STORAGE_PATH, LOG_PATH, CONFIGS_PATH
+from F import read_yaml, save_as_yaml, locked, check_header, run_lock
+from feeds import compile_feeds
+from seen_index import SeenIndex
+from http_cache import ValidatorCache
+from fingerprints import FingerprintStore
+from proxy_store import ProxyStore
+from metrics import Metrics
+from log_writer import rotate
+from sinks import SqliteSink
+
+SHARDS_PATH = os.path.join(STORAGE_PATH, 'shards')
+LOCK_FILE = f"{STORAGE_PATH}/{configs['run_lock']['filename']}.lock"
+
+
+###########################################################################################
+###                                     Work queue                                      ###
+
+class WorkQueue:
+    """
+    Queue of urls to be parsed kept in SQLite database. Workers (processes on this machine or on other machines
+    sharing the folder) take urls in batches, a url taken by a worker which has not finished it in stale_after
+    seconds (e.g. the worker has crashed) is given to another worker
+
+    Parameters
+    ----------
+    file : string
+        Path to the database file
+
+    timeout : int or float
+        Time (in seconds) to wait for the database to be unlocked
+    """
+    def __init__(self, file, timeout=60):
+        self.file = file
+        self.timeout = timeout
+        with closing(self.connect()) as connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS tasks (run_id TEXT, feed INTEGER, kind TEXT, status TEXT, '
+                               'worker TEXT, started REAL, finished REAL, PRIMARY KEY (run_id, feed))')
+
+    def connect(self):
+        return sqlite3.connect(self.file, timeout=self.timeout, isolation_level=None)
+
+    def submit(self, run_id, feeds):
+        """
+        Adds urls to the queue
+
+        Parameters
+        ----------
+        run_id : string
+            Id of the run
+
+        feeds : array-like of tuples
+            (index of url in source|url|requires_proxy, kind) pairs, kind is 'no_proxy' or 'proxy'
+        """
+        with closing(self.connect()) as connection:
+            connection.execute('BEGIN IMMEDIATE')
+            connection.executemany("INSERT OR IGNORE INTO tasks (run_id, feed, kind, status) VALUES (?, ?, ?, 'pending')",
+                                   [(run_id, it, kind) for it, kind in feeds])
+            connection.execute('COMMIT')
+
+    def claim(self, run_id, kind, worker, n, stale_after=3600):
+        """
+        Takes up to n urls of kind for worker
+
+        Returns
+        -------
+        ids : list of ints
+            Indices of urls (empty if there are no urls left)
+        """
+        now = time.time()
+        with closing(self.connect()) as connection:
+            connection.execute('BEGIN IMMEDIATE')
+            rows = connection.execute("SELECT feed FROM tasks WHERE run_id = ? AND kind = ? AND "
+                                      "(status = 'pending' OR (status = 'running' AND started < ?)) "
+                                      "ORDER BY feed LIMIT ?", (run_id, kind, now - stale_after, n)).fetchall()
+            ids = [row[0] for row in rows]
+            connection.executemany("UPDATE tasks SET status = 'running', worker = ?, started = ? WHERE run_id = ? AND feed = ?",
+                                   [(worker, now, run_id, it) for it in ids])
+            connection.execute('COMMIT')
+        return ids
+
+    def complete(self, run_id, ids, status='done'):
+        """
+        Marks urls as finished ('done') or 'failed'
+        """
+        with closing(self.connect()) as connection:
+            connection.execute('BEGIN IMMEDIATE')
+            connection.executemany('UPDATE tasks SET status = ?, finished = ? WHERE run_id = ? AND feed = ?',
+                                   [(status, time.time(), run_id, it) for it in ids])
+            connection.execute('COMMIT')
+
+    def progress(self, run_id):
+        """
+        Returns number of urls of the run in each status in format d[status] = number
+        """
+        with closing(self.connect()) as connection:
+            rows = connection.execute('SELECT status, COUNT(*) FROM tasks WHERE run_id = ? GROUP BY status', (run_id,)).fetchall()
+        return dict(rows)
+
+    def finished(self, run_id):
+        """
+        Returns finished urls of the run as list of (index of url, kind, worker) tuples
+        """
+        with closing(self.connect()) as connection:
+            return connection.execute("SELECT feed, kind, worker FROM tasks WHERE run_id = ? AND status IN ('done', 'failed')",
+                                      (run_id,)).fetchall()
+
+    def remove(self, run_id):
+        """
+        Removes urls of the run from the queue
+        """
+        with closing(self.connect()) as connection:
+            connection.execute('DELETE FROM tasks WHERE run_id = ?', (run_id,))
+
+
+def open_queue():
+    return WorkQueue(file=f"{STORAGE_PATH}/{configs['sharding']['queue_filename']}.sqlite")
+
+
+###########################################################################################
+###                                      Workers                                        ###
+
+def worker_paths(run_id, worker):
+    """
+    Returns folders of worker (data and state, log, proxies) in format d[name] = path
+    """
+    folder = os.path.join(SHARDS_PATH, run_id, worker)
+    return {'storage': os.path.join(folder, 'data'),
+            'log': os.path.join(folder, 'log'),
+            'configs': os.path.join(folder, 'configs')}
+
+
+def state_files():
+    """
+    Returns state files as list of (folder name, filename) pairs
+    """
+    return [('storage', f"{configs['seen_index']['filename']}.bin"),
+            ('storage', f"{configs['http_cache']['filename']}.yaml"),
+            ('storage', f"{configs['fingerprints']['filename']}.json"),
+            ('configs', f"{configs['proxy_store']['filename']}.yaml"),
+            ('configs', 'proxies.yaml')]
+
+
+def work(run_id, kind, worker):
+    """
+    Parses urls of kind taken from the queue until there are no urls left. Worker writes data and log to its
+    own folders and works with its own copy of the state, they are merged by merge function
+
+    Parameters
+    ----------
+    run_id : string
+        Id of the run
+
+    kind : string
+        'no_proxy' or 'proxy'
+
+    worker : string
+        Name of the worker
+    """
+    paths = worker_paths(run_id, worker)
+    main_paths = {'storage': STORAGE_PATH, 'log': LOG_PATH, 'configs': CONFIGS_PATH}
+    for path in paths.values():
+        os.makedirs(path, exist_ok=True)
+    for name, filename in state_files():
+        if os.path.isfile(f'{main_paths[name]}/{filename}') and not os.path.isfile(f'{paths[name]}/{filename}'):
+            shutil.copy(f'{main_paths[name]}/{filename}', f'{paths[name]}/{filename}')
+
+    collector = Collector(configs,
+                          storage_path=paths['storage'],
+                          log_path=paths['log'],
+                          configs_path=paths['configs'])
+    queue = open_queue()
+    while True:
+        ids = queue.claim(run_id, kind, worker,
+                          n=configs['sharding']['batch_size'],
+                          stale_after=configs['sharding']['stale_after'])
+        if len(ids) == 0:
+            break
+        try:
+            collector.run(ids=ids, proxy_refresh=float('inf'))
+        except Exception:
+            traceback.print_exc()
+            queue.complete(run_id, ids, status='failed')
+            continue
+        queue.complete(run_id, ids)
+
+
+###########################################################################################
+###                                       Merging                                       ###
+
+def append_file(src, dst, skip_header=False):
+    """
+    Appends content of file src to file dst (header of csv file src is skipped if dst is not empty,
+    dst with another header is moved aside, see check_header)
+    """
+    if not os.path.isfile(src):
+        return
+    if skip_header:
+        with open(src, 'r', encoding='utf8', newline='') as f:
+            check_header(dst, next(csv.reader(f), []))
+    with open(src, 'rb') as r, open(dst, 'ab') as w, locked(w):
+        if skip_header and os.fstat(w.fileno()).st_size > 0:
+            r.readline()
+        shutil.copyfileobj(r, w)
+
+
+def append_database(src, path, filename):
+    """
+    Appends rows of SQLite database src (see SqliteSink) to database filename.sqlite in folder path
+    """
+    if not os.path.isfile(src):
+        return
+    with closing(sqlite3.connect(src)) as connection:
+        cursor = connection.execute('SELECT * FROM data ORDER BY rowid')
+        fields = [column[0] for column in cursor.description]
+        with SqliteSink(path=path, filename=filename, fields=fields) as sink:
+            for rows in iter(lambda: cursor.fetchmany(sink.batch_size), []):
+                sink.write(dict(zip(fields, zip(*rows))))
+
+
+def move_dataset(src, dst):
+    """
+    Moves files of partitioned dataset (see ColumnarSink) from folder src to folder dst
+    """
+    for root, _, files in os.walk(src):
+        for file in files:
+            folder = os.path.join(dst, os.path.relpath(root, src))
+            os.makedirs(folder, exist_ok=True)
+            os.replace(os.path.join(root, file), os.path.join(folder, file))
+
+
+def rotate_log(file):
+    if configs['log_writer']['enabled']:
+        rotate(file=file,
+               max_bytes=configs['log_writer']['max_bytes'],
+               backup_count=configs['log_writer']['backup_count'],
+               compress=configs['log_writer']['compress'])
+
+
+def merge(run_id):
+    """
+    Merges data, log, metrics and state of all workers of the run into the main files and removes
+    folders of the workers
+
+    Parameters
+    ----------
+    run_id : string
+        Id of the run
+    """
+    queue = open_queue()
+    finished = queue.finished(run_id)
+    feeds = compile_feeds(configs)
+    seen_index = SeenIndex(path=STORAGE_PATH,
+                           filename=configs['seen_index']['filename'],
+                           max_items=configs['seen_index']['max_items']) if configs['seen_index']['enabled'] else None
+    cache = ValidatorCache(path=STORAGE_PATH,
+                           filename=configs['http_cache']['filename']) if configs['http_cache']['enabled'] else None
+    fingerprints = FingerprintStore(path=STORAGE_PATH,
+                                    filename=configs['fingerprints']['filename']) if configs['fingerprints']['enabled'] else None
+    proxy_store = ProxyStore(path=CONFIGS_PATH,
+                             **configs['proxy_store'])
+    metrics = Metrics(path=LOG_PATH,
+                      filename=configs['metrics']['filename'],
+                      prometheus=configs['metrics']['prometheus']) if configs['metrics']['enabled'] else None
+    fine_proxies = []
+    proxy_workers = False
+
+    for folder in sorted(glob.glob(os.path.join(SHARDS_PATH, run_id, '*'))):
+        worker = os.path.basename(folder)
+        paths = worker_paths(run_id, worker)
+        for kind in ['no_proxy', 'proxy']:
+            filename = configs['data_filename'][kind]
+            append_file(f"{paths['storage']}/{filename}.csv", f'{STORAGE_PATH}/{filename}.csv', skip_header=True)
+            append_database(f"{paths['storage']}/{filename}.sqlite", STORAGE_PATH, filename)
+            move_dataset(f"{paths['storage']}/{filename}", f'{STORAGE_PATH}/{filename}')
+
+            filename = configs['log_filename'][kind]
+            for extension in ['csv', 'txt', 'jsonl']:
+                rotate_log(f'{LOG_PATH}/{filename}.{extension}')
+                append_file(f"{paths['log']}/{filename}.{extension}", f'{LOG_PATH}/{filename}.{extension}',
+                            skip_header=extension == 'csv')
+            append_database(f"{paths['log']}/{filename}.sqlite", LOG_PATH, filename)
+            move_dataset(f"{paths['log']}/{filename}", f'{LOG_PATH}/{filename}')
+
+        if seen_index is not None:
+            seen_index.merge(SeenIndex(path=paths['storage'],
+                                       filename=configs['seen_index']['filename'],
+                                       max_items=configs['seen_index']['max_items']))
+        if cache is not None:
+            cache.merge(ValidatorCache(path=paths['storage'],
+                                       filename=configs['http_cache']['filename']),
+                        urls=[feeds[it].url for it, _, item_worker in finished if item_worker == worker])
+        if fingerprints is not None:
+            fingerprints.merge(FingerprintStore(path=paths['storage'],
+                                                filename=configs['fingerprints']['filename']),
+                               urls=[feeds[it].url for it, _, item_worker in finished if item_worker == worker])
+        if metrics is not None and os.path.isfile(f"{paths['log']}/{configs['metrics']['filename']}.jsonl"):
+            with open(f"{paths['log']}/{configs['metrics']['filename']}.jsonl", 'r', encoding='utf8') as f:
+                for line in f:
+                    metrics.add(json.loads(line))
+        if any([kind == 'proxy' and item_worker == worker for _, kind, item_worker in finished]):
+            proxy_workers = True
+            proxy_store.merge(ProxyStore(path=paths['configs'],
+                                         **configs['proxy_store']))
+            if os.path.isfile(f"{paths['configs']}/proxies.yaml"):
+                items = read_yaml(path=paths['configs'], filename='proxies')['items']
+                fine_proxies += [item for item in items if item not in fine_proxies]
+
+    if proxy_workers:
+        save_as_yaml(file={'items': fine_proxies},
+                     path=CONFIGS_PATH,
+                     filename='proxies')
+    proxy_store.save()
+    if seen_index is not None:
+        seen_index.save()
+    if cache is not None:
+        cache.save()
+    if fingerprints is not None:
+        fingerprints.save()
+    if metrics is not None:
+        metrics.save()
+    shutil.rmtree(os.path.join(SHARDS_PATH, run_id), ignore_errors=True)
+    queue.remove(run_id)
+
+
+###########################################################################################
+###                                      Running                                        ###
+
+def submit():
+    """
+    Adds all urls to the queue and returns id of the new run
+    """
+    run_id = datetime.datetime.now().strftime('%Y%m%d%H%M%S')
+    open_queue().submit(run_id, [(feed.id, feed.kind) for feed in compile_feeds(configs)])
+    return run_id
+
+
+def run():
+    """
+    Parses all urls by worker processes (urls with and without proxy are parsed at the same time)
+    and merges their results. The run is skipped (or waits, see run_lock in configs) if another run is active
+    """
+    with run_lock(file=LOCK_FILE, wait=configs['run_lock']['wait']) as acquired:
+        if acquired:
+            run_locked()
+        else:
+            print(f'{datetime.datetime.now()} | Another run is active, the run is skipped')
+
+
+def run_locked():
+    """
+    Same as run, but without taking the run lock
+    """
+    run_id = submit()
+    feeds = compile_feeds(configs)
+
+    processes = []
+    for kind in ['no_proxy', 'proxy']:
+        for k in range(min(configs['sharding']['workers'][kind], len(feeds.by_kind[kind]))):
+            process = multiprocessing.Process(target=work, args=(run_id, kind, f'{kind}-{k}'))
+            process.start()
+            processes.append(process)
+    for process in processes:
+        process.join()
+
+    print(f'{datetime.datetime.now()} | Run {run_id}: {open_queue().progress(run_id)}')
+    merge(run_id)
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='Sharded parsing of urls by several worker processes')
+    subparsers = arg_parser.add_subparsers(dest='command')
+    subparsers.add_parser('run', help='parse all urls by local workers and merge results (default)')
+    subparsers.add_parser('submit', help='add all urls to the queue and print id of the run')
+    work_parser = subparsers.add_parser('work', help='parse urls of the run taken from the queue')
+    work_parser.add_argument('run_id')
+    work_parser.add_argument('kind', choices=['no_proxy', 'proxy'])
+    work_parser.add_argument('--name', default=f'{socket.gethostname()}-{os.getpid()}', help='name of the worker')
+    merge_parser = subparsers.add_parser('merge', help='merge results of all workers of the run')
+    merge_parser.add_argument('run_id')
+    args = arg_parser.parse_args()
+
+    if args.command == 'submit':
+        print(submit())
+    elif args.command == 'work':
+        work(args.run_id, args.kind, args.name)
+    elif args.command == 'merge':
+        with run_lock(file=LOCK_FILE, wait=True):
+            merge(args.run_id)
+    else:
+        run()
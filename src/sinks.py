@@ -0,0 +1,393 @@
+import csv
+import datetime
+import os
+import sqlite3
+from F import locked, check_header
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+
+class BaseSink:
+    """
+    Base class for storages to which parsed data is written.
+    Rows are buffered and written in batches, so that the memory used does not depend on the number
+    of parsed items and already written rows survive a failure of the run
+
+    Parameters
+    ----------
+    path : string
+        Path to the folder with the data
+
+    filename : string
+        Name of the file or of the folder with the data (without extension)
+
+    fields : array-like of strings
+        Names of columns
+
+    batch_size : int
+        Number of rows to be buffered before they are written
+    """
+    def __init__(self, path, filename, fields, batch_size=500):
+        self.path = path
+        self.filename = filename
+        self.fields = list(fields)
+        self.batch_size = batch_size
+        self.rows = []
+
+    def open(self):
+        return self
+
+    def write(self, data):
+        """
+        Adds parsed data to the buffer (the buffer is written when it contains at least batch_size rows)
+
+        Parameters
+        ----------
+        data : dict
+            Dictionary with lists of values for each of the fields
+        """
+        self.rows.extend(zip(*[data[field] for field in self.fields]))
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes buffered rows
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """
+        Writes buffered rows and releases the storage
+        """
+        self.flush()
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class CsvSink(BaseSink):
+    """
+    Csv file to which rows are appended (default storage). The file is locked while a batch is written,
+    so that batches of several processes writing to the same file are not interleaved. The file with
+    other columns is moved aside when the sink is opened (see check_header)
+    """
+    def __init__(self, path, filename, fields, batch_size=500):
+        super().__init__(path, filename, fields, batch_size)
+        self.file = f'{path}/{filename}.csv'
+        self.f = None
+
+    def open(self):
+        """
+        Opens the file for appending (header is written if the file is empty)
+        """
+        if self.f is None:
+            check_header(self.file, self.fields)
+            self.f = open(self.file, 'a', encoding='utf8', newline='')
+            self.writer = csv.writer(self.f)
+            with locked(self.f):
+                if os.fstat(self.f.fileno()).st_size == 0:
+                    self.writer.writerow(self.fields)
+        return self
+
+    def flush(self):
+        """
+        Writes buffered rows to the file
+        """
+        if len(self.rows) > 0:
+            self.open()
+            with locked(self.f):
+                self.writer.writerows(self.rows)
+            self.rows = []
+        if self.f is not None:
+            self.f.flush()
+            os.fsync(self.f.fileno())
+
+    def close(self):
+        """
+        Writes buffered rows and closes the file
+        """
+        self.flush()
+        if self.f is not None:
+            self.f.close()
+            self.f = None
+
+
+class ColumnarSink(BaseSink):
+    """
+    Columnar storage (Parquet or Arrow IPC files) which requires pyarrow library.
+    Each run writes one file per partition into folder path/filename, partitions are folders
+    in format day=YYYY-MM-DD/source=name, so that readers (e.g. pyarrow.dataset with hive partitioning)
+    can read only the columns and partitions they need. Writers of partitions are kept open while the sink
+    is open and each flush appends a row group (record batch) to them. Files are written under hidden
+    names (ignored by readers) and are renamed when the sink is closed, so that a failed run does not leave
+    truncated files in the dataset. Values of timestamp_fields are stored as timestamps, other values are
+    stored as strings
+
+    Parameters
+    ----------
+    fmt : string
+        Format of files ('parquet' or 'arrow')
+
+    partition_by : array-like of strings
+        Partitioning keys ('day' - day of the first of timestamp_fields, 'source' - value of source field)
+
+    timestamp_fields : array-like of strings
+        Fields to be stored as timestamps
+    """
+    def __init__(self, path, filename, fields, batch_size=500, fmt='parquet', partition_by=('day', 'source'),
+                 timestamp_fields=('date_parsed', 'TIME')):
+        if pa is None:
+            raise ImportError(f'pyarrow library is required for {fmt} sink')
+        super().__init__(path, filename, fields, batch_size)
+        self.fmt = fmt
+        self.partition_by = [key for key in partition_by if key != 'source' or 'source' in self.fields]
+        self.timestamp_fields = [field for field in self.fields if field in timestamp_fields]
+        self.run_id = f"{datetime.datetime.now().strftime('%Y%m%d%H%M%S%f')}-{os.getpid()}"
+        self.part_id = 0
+        self.writers = {}
+
+    def partition(self, row):
+        """
+        Returns relative path of the partition of row
+        """
+        parts = []
+        for key in self.partition_by:
+            if key == 'day':
+                value = row[self.fields.index(self.timestamp_fields[0])] if self.timestamp_fields else None
+                value = (value if isinstance(value, datetime.datetime) else datetime.datetime.now()).date()
+            else:
+                value = row[self.fields.index(key)]
+            parts.append(f'{key}={value}')
+        return os.path.join(*parts) if parts else ''
+
+    def table(self, rows):
+        """
+        Returns pyarrow table built from rows (partitioning columns are not included)
+        """
+        columns = list(zip(*rows))
+        arrays, names = [], []
+        for field, values in zip(self.fields, columns):
+            if field in self.partition_by:
+                continue
+            if field in self.timestamp_fields:
+                arrays.append(pa.array(values, type=pa.timestamp('us')))
+            else:
+                arrays.append(pa.array([None if value is None else str(value) for value in values], type=pa.string()))
+            names.append(field)
+        return pa.Table.from_arrays(arrays, names=names)
+
+    def writer(self, partition, schema):
+        """
+        Returns writer of the file of partition (it is opened if it is not open yet)
+        """
+        if partition not in self.writers:
+            folder = os.path.join(self.path, self.filename, partition)
+            os.makedirs(folder, exist_ok=True)
+            file = os.path.join(folder, f'part-{self.run_id}-{self.part_id:05d}.{self.fmt}')
+            tmp = os.path.join(folder, f'.part-{self.run_id}-{self.part_id:05d}.{self.fmt}.tmp')
+            if self.fmt == 'parquet':
+                self.writers[partition] = (file, tmp, None, pq.ParquetWriter(tmp, schema))
+            else:
+                f = pa.OSFile(tmp, 'wb')
+                self.writers[partition] = (file, tmp, f, pa.ipc.new_file(f, schema))
+        return self.writers[partition][3]
+
+    def flush(self):
+        """
+        Writes buffered rows to the file of each partition
+        """
+        if len(self.rows) == 0:
+            return
+        partitions = {}
+        for row in self.rows:
+            partitions.setdefault(self.partition(row), []).append(row)
+
+        for partition, rows in partitions.items():
+            table = self.table(rows)
+            self.writer(partition, table.schema).write_table(table)
+        self.rows = []
+
+    def close(self):
+        """
+        Writes buffered rows, closes files of all partitions and gives them their final names
+        """
+        try:
+            self.flush()
+        finally:
+            writers, self.writers = self.writers, {}
+            self.part_id += 1
+            for file, tmp, f, writer in writers.values():
+                writer.close()
+                if f is not None:
+                    f.close()
+                os.replace(tmp, file)
+
+
+class SqliteSink(BaseSink):
+    """
+    SQLite database (path/filename.sqlite) in WAL mode, each batch of rows is inserted into table in one transaction.
+    Several processes (e.g. an overlapping run or workers of sharded collection) can write to the same database
+    at once, readers are not blocked by writers. Columns missing in the table (e.g. new log columns) are added.
+    Values of timestamp_fields are stored as ISO strings, other values are stored as text. Table is indexed by
+    index_fields, so that rows of a source for a period can be read quickly (see select method)
+
+    Parameters
+    ----------
+    table : string
+        Name of the table
+
+    timeout : int or float
+        Time (in seconds) to wait for the database to be unlocked
+
+    timestamp_fields : array-like of strings
+        Fields to be stored as timestamps
+
+    index_fields : array-like of strings
+        Fields to be indexed (if they are among fields)
+    """
+    def __init__(self, path, filename, fields, batch_size=500, table='data', timeout=60,
+                 timestamp_fields=('date_parsed', 'TIME'), index_fields=('source', 'date', 'date_parsed', 'TIME')):
+        super().__init__(path, filename, fields, batch_size)
+        self.file = f'{path}/{filename}.sqlite'
+        self.table = table
+        self.timeout = timeout
+        self.timestamp_fields = [field for field in self.fields if field in timestamp_fields]
+        self.index_fields = [field for field in self.fields if field in index_fields]
+        self.connection = None
+
+    @staticmethod
+    def quote(name):
+        """
+        Returns quoted name of table or column
+        """
+        return '"' + str(name).replace('"', '""') + '"'
+
+    def open(self):
+        """
+        Connects to the database and creates the table and its indices if necessary
+        """
+        if self.connection is None:
+            self.connection = sqlite3.connect(self.file, timeout=self.timeout, isolation_level=None)
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.execute('PRAGMA synchronous=NORMAL')
+            table = self.quote(self.table)
+            self.connection.execute('BEGIN IMMEDIATE')
+            self.connection.execute(f'CREATE TABLE IF NOT EXISTS {table} '
+                                    f'({", ".join([f"{self.quote(field)} TEXT" for field in self.fields])})')
+            columns = [row[1] for row in self.connection.execute(f'PRAGMA table_info({table})')]
+            for field in [field for field in self.fields if field not in columns]:
+                self.connection.execute(f'ALTER TABLE {table} ADD COLUMN {self.quote(field)} TEXT')
+            for field in self.index_fields:
+                self.connection.execute(f'CREATE INDEX IF NOT EXISTS {self.quote(f"{self.table}_{field}")} '
+                                        f'ON {table} ({self.quote(field)})')
+            self.connection.execute('COMMIT')
+        return self
+
+    @staticmethod
+    def value(value):
+        """
+        Returns value as it is stored
+        """
+        if value is None:
+            return None
+        if isinstance(value, (datetime.datetime, datetime.date)):
+            return value.isoformat(sep=' ') if isinstance(value, datetime.datetime) else value.isoformat()
+        return str(value)
+
+    def flush(self):
+        """
+        Inserts buffered rows in one transaction
+        """
+        if len(self.rows) == 0:
+            return
+        self.open()
+        columns = ', '.join([self.quote(field) for field in self.fields])
+        values = ', '.join(['?'] * len(self.fields))
+        self.connection.execute('BEGIN IMMEDIATE')
+        try:
+            self.connection.executemany(f'INSERT INTO {self.quote(self.table)} ({columns}) VALUES ({values})',
+                                        [[self.value(value) for value in row] for row in self.rows])
+            self.connection.execute('COMMIT')
+        except BaseException:
+            self.connection.execute('ROLLBACK')
+            raise
+        self.rows = []
+
+    def select(self, source=None, start=None, end=None, date_field=None):
+        """
+        Returns rows of the table (written rows only, see flush method)
+
+        Parameters
+        ----------
+        source : string or None
+            Source name of rows (all sources if None)
+
+        start, end : datetime.datetime or None
+            Bounds of the period (including start and excluding end) which date_field of rows must be within
+
+        date_field : string or None
+            Field compared with start and end (the first of timestamp_fields if None)
+
+        Returns
+        -------
+        data : dict
+            Dictionary with lists of values for each of the fields
+        """
+        self.open()
+        date_field = date_field or (self.timestamp_fields[0] if self.timestamp_fields else None)
+        conditions, params = [], []
+        for column, operator, value in [('source', '=', source), (date_field, '>=', start), (date_field, '<', end)]:
+            if value is not None:
+                conditions.append(f'{self.quote(column)} {operator} ?')
+                params.append(self.value(value))
+        query = f'SELECT {", ".join([self.quote(field) for field in self.fields])} FROM {self.quote(self.table)}'
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        rows = self.connection.execute(query + ' ORDER BY rowid', params).fetchall()
+        columns = zip(*rows) if rows else [[] for _ in self.fields]
+        return dict([(field, list(values)) for field, values in zip(self.fields, columns)])
+
+    def close(self):
+        """
+        Inserts buffered rows and closes the connection
+        """
+        self.flush()
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+def make_sink(backend, path, filename, fields, batch_size=500, partition_by=('day', 'source')):
+    """
+    Returns sink of the specified backend
+
+    Parameters
+    ----------
+    backend : string
+        Storage backend ('csv', 'parquet', 'arrow' or 'sqlite')
+
+    path, filename, fields, batch_size :
+        See BaseSink
+
+    partition_by : array-like of strings
+        See ColumnarSink (used by parquet and arrow backends only)
+
+    Returns
+    -------
+    sink : BaseSink
+    """
+    if backend == 'csv':
+        return CsvSink(path, filename, fields, batch_size)
+    if backend == 'sqlite':
+        return SqliteSink(path, filename, fields, batch_size)
+    if backend in ['parquet', 'arrow']:
+        return ColumnarSink(path, filename, fields, batch_size, fmt=backend, partition_by=partition_by)
+    raise ValueError(f'Unknown sink backend: {backend}')